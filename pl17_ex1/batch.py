@@ -0,0 +1,214 @@
+"""
+This module contains batch parsing of many JSON documents over a process
+pool.
+
+Usage:
+    python batch.py [options] PATH...
+
+Each PATH is a JSON file or a directory (all of whose *.json files are
+parsed). With --jsonl, each PATH is instead a JSON-lines file, holding one
+document per line.
+
+    python batch.py --check
+
+parses a document with thousands of members over a pool, and checks the
+results against a parse in the same process.
+"""
+
+import argparse
+import multiprocessing
+import os
+
+from flat_tree import FlatTree, FlatTreeParser
+from scanner import iter_scan
+from tree_to_dot import tree_to_dot
+
+
+def parse_flat(text, dot=False):
+    """
+    Lex and parse one document, and return it as a FlatTree (or its dot
+    source, if dot is true).
+    """
+    parser = FlatTreeParser(iter_scan(text))
+    parser.set_observer(None)
+    tree = parser.parse()
+    if dot:
+        return tree_to_dot(tree)
+    return tree
+
+
+def parse_text(text, dot=False):
+    """
+    Lex and parse one document, and return its parse tree (or its dot
+    source, if dot is true).
+    """
+    result = parse_flat(text, dot)
+    return result if dot else result.to_tree()
+
+
+def _parse_job(job):
+    """
+    Parse one job (kind, source, dot), where kind is 'file' (source is a
+    file name) or 'text'. Return ('ok', result) or ('error', exception),
+    where result is a FlatTree or a dot source: the tree of tuples of a
+    large obj nests a MembersTag node per member, too deep to be pickled
+    back from a worker, so it is only built by run_jobs.
+    Any exception (not only a SyntaxError or LexError, but also, for
+    example, the RuntimeError of a too deeply nested document) is returned
+    as the error of this job, so it does not abort the rest of the batch.
+    """
+    kind, source, dot = job
+    try:
+        if kind == 'file':
+            with open(source) as f:
+                source = f.read()
+        return 'ok', parse_flat(source, dot)
+    except Exception as e:
+        return 'error', e
+
+
+def collect_files(paths):
+    """
+    Return the list of files given by paths, expanding directories to the
+    *.json files in them (sorted by name).
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                if name.endswith('.json') and os.path.isfile(full):
+                    files.append(full)
+        else:
+            files.append(path)
+    return files
+
+
+def read_jsonl(paths):
+    """
+    Return the list of pairs (location, document) of the documents in the
+    given JSON-lines files, where location is "path:line". Blank lines are
+    skipped.
+    """
+    documents = []
+    for path in paths:
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    documents.append(('{}:{}'.format(path, number), line))
+    return documents
+
+
+def run_jobs(jobs, processes=None, chunksize=1):
+    """
+    Run the jobs over a pool, and return their results in order, with the
+    FlatTrees turned into trees of tuples.
+    """
+    if processes == 1:
+        results = [_parse_job(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_parse_job, jobs, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+    return [(status, result.to_tree() if isinstance(result, FlatTree) else result)
+            for status, result in results]
+
+
+def check(members=5000, processes=2):
+    """
+    Check that a document with many top-level members (whose tree of
+    tuples is too deep to pickle) parses the same over a pool as in this
+    process, in both output formats.
+    """
+    from scanner import make_json
+    texts = [make_json(members), '{"a": @}', make_json(10)]
+    for dot in (False, True):
+        expected = parse_texts(texts, 1, dot=dot)
+        results = parse_texts(texts, processes, dot=dot)
+        assert [status for status, _ in results] == ['ok', 'error', 'ok']
+        for (_, result), (_, other) in zip(results, expected)[::2]:
+            if not dot:
+                # compare through the dot source, as == on the deep tuples
+                # would hit the recursion limit
+                result, other = tree_to_dot(result), tree_to_dot(other)
+            assert result == other
+    print "ok"
+
+
+def parse_files(file_names, processes=None, chunksize=1, dot=False):
+    """
+    Parse the given files over a pool of processes, and return a list with
+    one pair (status, result) per file, in the given order. status is 'ok'
+    and result the parse tree (or its dot source, if dot is true), or status
+    is 'error' and result the exception raised (a SyntaxError, LexError,
+    IOError...).
+    """
+    return run_jobs([('file', name, dot) for name in file_names],
+                    processes, chunksize)
+
+
+def parse_texts(texts, processes=None, chunksize=1, dot=False):
+    """
+    Like parse_files, for documents given as strings.
+    """
+    return run_jobs([('text', text, dot) for text in texts],
+                    processes, chunksize)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Parse many JSON documents over a process pool.")
+    arg_parser.add_argument('paths', nargs='+',
+                            help="JSON files, directories of *.json files, "
+                                 "or JSON-lines files with --jsonl")
+    arg_parser.add_argument('--jsonl', action='store_true',
+                            help="read one document per line of each path")
+    arg_parser.add_argument('-j', '--processes', type=int, default=None,
+                            help="number of worker processes (default: cores)")
+    arg_parser.add_argument('--chunksize', type=int, default=16,
+                            help="documents sent to a worker at a time")
+    arg_parser.add_argument('--dot', metavar='DIR',
+                            help="write the dot source of every parse tree "
+                                 "to DIR")
+    args = arg_parser.parse_args(argv)
+
+    if args.jsonl:
+        documents = read_jsonl(args.paths)
+        names = [location for location, document in documents]
+        bases = []
+        for location in names:
+            path, line = location.rsplit(':', 1)
+            bases.append('{}_{}'.format(
+                os.path.splitext(os.path.basename(path))[0], line))
+        results = parse_texts([document for location, document in documents],
+                              args.processes, args.chunksize,
+                              args.dot is not None)
+    else:
+        names = collect_files(args.paths)
+        bases = [os.path.splitext(os.path.basename(name))[0] for name in names]
+        results = parse_files(names, args.processes, args.chunksize,
+                              args.dot is not None)
+
+    if args.dot is not None and not os.path.isdir(args.dot):
+        os.makedirs(args.dot)
+    errors = 0
+    for name, base, (status, result) in zip(names, bases, results):
+        if status == 'error':
+            errors += 1
+            print "{}: {}".format(name, result)
+        elif args.dot is not None:
+            with open(os.path.join(args.dot, base + '.gv'), 'w') as f:
+                f.write(result)
+    print "{} documents, {} errors".format(len(results), errors)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] == ['--check']:
+        check()
+    else:
+        raise SystemExit(main())
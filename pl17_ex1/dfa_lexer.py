@@ -0,0 +1,350 @@
+"""
+This module contains a lexer generator, which turns the regular expressions
+in lexer.token_regex into a table-driven DFA, and a lexer that runs it.
+
+The generator understands the small regular expression language the token
+definitions are written in: literal characters, escapes (\\{, \\d, \\n...),
+character classes ([abc], [^"], [a-z]), '.', grouping, '|', and the
+quantifiers '*', '+' and '?'.
+
+Characters are grouped into equivalence classes (characters that no pattern
+can tell apart share a class), and the DFA is stored as one flat list of
+integers indexed by state * number_of_classes + class.
+"""
+
+from lexer import token_regex
+from scanner import LexError, WHITESPACE, whitespace_regex
+
+# characters are 0..255, and every character above 255 (in unicode input)
+# is represented by OTHER
+OTHER = 256
+ALL_CHARS = frozenset(range(OTHER + 1))
+
+DEAD = 0  # the DFA state with no way out
+
+_escapes = {
+    'd': frozenset(range(ord('0'), ord('9') + 1)),
+    's': frozenset(map(ord, ' \t\n\r\f\v')),
+    'n': frozenset([ord('\n')]),
+    't': frozenset([ord('\t')]),
+    'r': frozenset([ord('\r')]),
+    'f': frozenset([ord('\f')]),
+    'v': frozenset([ord('\v')]),
+}
+_escapes['w'] = frozenset(
+    [ord('_')] + range(ord('a'), ord('z') + 1) +
+    range(ord('A'), ord('Z') + 1) + range(ord('0'), ord('9') + 1))
+_escapes['D'] = ALL_CHARS - _escapes['d']
+_escapes['S'] = ALL_CHARS - _escapes['s']
+_escapes['W'] = ALL_CHARS - _escapes['w']
+
+
+class RegexError(Exception):
+    pass
+
+
+class NFA(object):
+    """
+    A Thompson NFA. State i has the epsilon moves epsilon[i] and the
+    character moves moves[i], a list of (charset, target) pairs.
+    """
+    def __init__(self):
+        self.epsilon = []
+        self.moves = []
+
+    def new_state(self):
+        self.epsilon.append([])
+        self.moves.append([])
+        return len(self.epsilon) - 1
+
+
+class RegexParser(object):
+    """
+    A recursive descent parser for a single regular expression, that adds
+    its fragment to an NFA. Each parse_XXX function returns a pair of
+    states (start, end) of the fragment it built.
+    """
+    def __init__(self, regex, nfa):
+        self.regex = regex
+        self.pos = 0
+        self.nfa = nfa
+
+    def peek(self):
+        if self.pos < len(self.regex):
+            return self.regex[self.pos]
+        return None
+
+    def next(self):
+        c = self.peek()
+        if c is None:
+            raise RegexError("Unexpected end of regex: {}".format(self.regex))
+        self.pos += 1
+        return c
+
+    def parse(self):
+        fragment = self.parse_alternation()
+        if self.peek() is not None:
+            raise RegexError("Unexpected {!r} at {} in regex: {}".format(
+                self.peek(), self.pos, self.regex))
+        return fragment
+
+    def parse_alternation(self):
+        fragments = [self.parse_concatenation()]
+        while self.peek() == '|':
+            self.next()
+            fragments.append(self.parse_concatenation())
+        if len(fragments) == 1:
+            return fragments[0]
+        start = self.nfa.new_state()
+        end = self.nfa.new_state()
+        for s, e in fragments:
+            self.nfa.epsilon[start].append(s)
+            self.nfa.epsilon[e].append(end)
+        return start, end
+
+    def parse_concatenation(self):
+        start = end = self.nfa.new_state()
+        while self.peek() not in (None, '|', ')'):
+            s, e = self.parse_repetition()
+            self.nfa.epsilon[end].append(s)
+            end = e
+        return start, end
+
+    def parse_repetition(self):
+        s, e = self.parse_atom()
+        while self.peek() in ('*', '+', '?'):
+            op = self.next()
+            start = self.nfa.new_state()
+            end = self.nfa.new_state()
+            self.nfa.epsilon[start].append(s)
+            self.nfa.epsilon[e].append(end)
+            if op in '*?':
+                self.nfa.epsilon[start].append(end)
+            if op in '*+':
+                self.nfa.epsilon[e].append(s)
+            s, e = start, end
+        return s, e
+
+    def parse_atom(self):
+        c = self.next()
+        if c == '(':
+            if self.regex.startswith('?:', self.pos):
+                self.pos += 2
+            fragment = self.parse_alternation()
+            if self.next() != ')':
+                raise RegexError("Missing ) in regex: {}".format(self.regex))
+            return fragment
+        if c == '[':
+            chars = self.parse_class()
+        elif c == '.':
+            chars = ALL_CHARS - frozenset([ord('\n')])
+        elif c == '\\':
+            chars = self.parse_escape()
+        elif c in '*+?|)':
+            raise RegexError("Unexpected {!r} at {} in regex: {}".format(
+                c, self.pos - 1, self.regex))
+        else:
+            chars = frozenset([ord(c)])
+        start = self.nfa.new_state()
+        end = self.nfa.new_state()
+        self.nfa.moves[start].append((chars, end))
+        return start, end
+
+    def parse_escape(self):
+        c = self.next()
+        if c in _escapes:
+            return _escapes[c]
+        if c.isalnum():
+            raise RegexError("Unsupported escape \\{} in regex: {}".format(
+                c, self.regex))
+        return frozenset([ord(c)])
+
+    def parse_class(self):
+        negate = self.peek() == '^'
+        if negate:
+            self.next()
+        chars = set()
+        first = True
+        while first or self.peek() != ']':
+            first = False
+            c = self.next()
+            if c == '\\':
+                item = self.parse_escape()
+            else:
+                item = frozenset([ord(c)])
+            if (len(item) == 1 and self.peek() == '-' and
+                    self.regex[self.pos + 1:self.pos + 2] not in ('', ']')):
+                self.next()
+                high = self.next()
+                if high == '\\':
+                    high = self.parse_escape()
+                    if len(high) != 1:
+                        raise RegexError("Bad range in regex: {}".format(self.regex))
+                    high = min(high)
+                else:
+                    high = ord(high)
+                item = frozenset(range(min(item), high + 1))
+            chars |= item
+        self.next()
+        if negate:
+            return ALL_CHARS - chars
+        return frozenset(chars)
+
+
+class DFA(object):
+    """
+    A table-driven DFA recognizing a set of tokens.
+
+    classes maps a character code (0..256, see OTHER) to its class,
+    table[state * nclasses + cls] is the next state, and accept[state] is
+    the index (into tokens) of the token recognized in that state, or -1.
+    """
+    def __init__(self, tokens, classes, nclasses, table, accept, start):
+        self.tokens = tokens
+        self.classes = classes
+        self.nclasses = nclasses
+        self.table = table
+        self.accept = accept
+        self.start = start
+        # translation table from characters to classes for str input, so a
+        # whole text is classified by a single str.translate
+        self.translation = ''.join(chr(classes[i]) for i in range(256))
+
+
+def _closure(nfa, states):
+    stack = list(states)
+    result = set(states)
+    while stack:
+        s = stack.pop()
+        for t in nfa.epsilon[s]:
+            if t not in result:
+                result.add(t)
+                stack.append(t)
+    return frozenset(result)
+
+
+def build_dfa(token_regex):
+    """
+    Build a DFA from a dictionary mapping terminals to regular expressions.
+    Whitespace is recognized as the token WHITESPACE.
+
+    When several tokens match the longest input, the one lex would try first
+    wins (whitespace, then token_regex.items() order).
+    """
+    spec = [(WHITESPACE, whitespace_regex)] + list(token_regex.items())
+    nfa = NFA()
+    start = nfa.new_state()
+    accepting = dict()  # NFA state -> token index
+    for index, (token, regex) in enumerate(spec):
+        s, e = RegexParser(regex, nfa).parse()
+        nfa.epsilon[start].append(s)
+        accepting[e] = index
+
+    # group characters that behave the same in every move into classes
+    charsets = []
+    seen = set()
+    for moves in nfa.moves:
+        for chars, _ in moves:
+            if chars not in seen:
+                seen.add(chars)
+                charsets.append(chars)
+    signatures = dict()
+    classes = []
+    for c in range(OTHER + 1):
+        signature = tuple(c in chars for chars in charsets)
+        classes.append(signatures.setdefault(signature, len(signatures)))
+    nclasses = len(signatures)
+    if nclasses > 256:
+        raise RegexError("Too many character classes")
+    representative = [None] * nclasses
+    for c in range(OTHER, -1, -1):
+        representative[classes[c]] = c
+
+    # subset construction; DFA state 0 is the dead state
+    start_set = _closure(nfa, [start])
+    state_sets = [frozenset(), start_set]
+    numbers = {frozenset(): DEAD, start_set: 1}
+    table = [DEAD] * nclasses
+    accept = [-1]
+    todo = 1
+    while todo < len(state_sets):
+        current = state_sets[todo]
+        todo += 1
+        matched = [accepting[s] for s in current if s in accepting]
+        accept.append(min(matched) if matched else -1)
+        for cls in range(nclasses):
+            c = representative[cls]
+            targets = [t for s in current for chars, t in nfa.moves[s] if c in chars]
+            target = _closure(nfa, targets)
+            if target not in numbers:
+                numbers[target] = len(state_sets)
+                state_sets.append(target)
+            table.append(numbers[target])
+
+    return DFA([token for token, _ in spec], classes, nclasses, table, accept, 1)
+
+
+# DFAs built so far, keyed by the token specification they were built from
+_dfa_cache = dict()
+
+
+def get_dfa(token_regex):
+    """
+    Return the DFA for the given token specification, building it only the
+    first time it is asked for.
+    """
+    key = tuple(token_regex.items())
+    dfa = _dfa_cache.get(key)
+    if dfa is None:
+        dfa = _dfa_cache[key] = build_dfa(token_regex)
+    return dfa
+
+
+def lex_dfa(text):
+    """
+    Parse the string given by text, and return a list of the form:
+    [(terminal, value), (terminal, value), ...]
+
+    This is a drop-in replacement for lex, driven by the DFA built from
+    token_regex. A bad token raises a LexError, like scan.
+    """
+    dfa = get_dfa(token_regex)
+    table = dfa.table
+    accept = dfa.accept
+    nclasses = dfa.nclasses
+    names = dfa.tokens
+    if isinstance(text, str):
+        classes = bytearray(text.translate(dfa.translation))
+    else:
+        classes = [dfa.classes[min(ord(c), OTHER)] for c in text]
+    n = len(classes)
+    tokens = []
+    pos = 0
+    while pos < n:
+        state = dfa.start
+        token = -1
+        end = i = pos
+        while i < n:
+            state = table[state * nclasses + classes[i]]
+            if state == DEAD:
+                break
+            i += 1
+            if accept[state] >= 0:
+                token = accept[state]
+                end = i
+        if token < 0:
+            raise LexError(pos, text)
+        if token:  # token 0 is whitespace
+            tokens.append((names[token], text[pos:end]))
+        pos = end
+    return tokens
+
+
+if __name__ == '__main__':
+    import time
+    from scanner import make_json, scan
+    text = make_json(8000)
+    for f in (scan, lex_dfa):
+        start = time.time()
+        f(text)
+        print "{:10} {:.4f}s".format(f.__name__, time.time() - start)
@@ -0,0 +1,238 @@
+"""
+This module contains FlatTree, a compact representation of parse trees as
+parallel flat arrays, and FlatTreeParser, a JsonParser that builds one
+directly.
+
+The nodes are numbered in preorder (the numbering tree_to_dot uses), and
+node i has:
+labels[codes[i]]  - its label (for a leaf, the token value)
+sizes[i]          - the number of nodes in its subtree, itself included
+parents[i]        - its parent, or -1 for the root
+leaves[i]         - 1 if it is a leaf (a token value), 0 otherwise
+token_starts[i]   - the index of the first token of its subtree
+token_ends[i]     - one past the index of the last token of its subtree
+
+The subtree of node i is exactly the nodes i..i+sizes[i]-1, so skipping
+a subtree is one addition. The arrays take a few bytes per node, and the
+whole object can be pickled.
+"""
+
+from array import array
+
+from parser import JsonParser, SyntaxError
+from symbols import *
+
+
+class FlatTree(object):
+    """
+    A parse tree stored as parallel arrays in preorder (see above).
+    """
+    def __init__(self):
+        self.labels = []  # code -> label
+        self.label_codes = dict()  # label -> code
+        self.codes = array('i')
+        self.sizes = array('i')
+        self.parents = array('i')
+        self.leaves = array('B')
+        self.token_starts = array('i')
+        self.token_ends = array('i')
+
+    def add(self, label, parent, leaf, token_start):
+        """
+        Add a node as the next one in preorder, and return its number.
+        Its size and token_end are set by close.
+        """
+        code = self.label_codes.get(label)
+        if code is None:
+            code = self.label_codes[label] = len(self.labels)
+            self.labels.append(label)
+        self.codes.append(code)
+        self.sizes.append(1)
+        self.parents.append(parent)
+        self.leaves.append(leaf)
+        self.token_starts.append(token_start)
+        self.token_ends.append(token_start + leaf)
+        return len(self.codes) - 1
+
+    def close(self, i, token_end):
+        """
+        Finish node i, once all of its subtree was added.
+        """
+        self.sizes[i] = len(self.codes) - i
+        self.token_ends[i] = token_end
+
+    def __len__(self):
+        return len(self.codes)
+
+    def label(self, i):
+        return self.labels[self.codes[i]]
+
+    def parent(self, i):
+        return self.parents[i]
+
+    def skip(self, i):
+        """
+        Return the number of the first node after the subtree of node i.
+        """
+        return i + self.sizes[i]
+
+    def children(self, i):
+        """
+        Generate the numbers of the children of node i.
+        """
+        j = i + 1
+        end = i + self.sizes[i]
+        while j < end:
+            yield j
+            j += self.sizes[j]
+
+    def nodes_and_edges(self):
+        """
+        Return the lists of (number, label) and (number, number) pairs
+        tree_to_dot draws, in the order it would draw them for the
+        equivalent tree of tuples.
+        """
+        nodes = [(i, self.label(i)) for i in range(len(self))]
+        # tree_to_dot adds the edges of a node once its subtree is done,
+        # that is in order of subtree end, inner nodes first
+        order = sorted(range(len(self)), key=lambda i: (i + self.sizes[i], -i))
+        edges = [(i, j) for i in order for j in self.children(i)]
+        return nodes, edges
+
+    def to_tree(self):
+        """
+        Return the equivalent tree of tuples:
+        (label, (child1, child2, ..., childN))
+        """
+        results = [None] * len(self)
+        for i in range(len(self) - 1, -1, -1):
+            if self.leaves[i]:
+                results[i] = self.label(i)
+            else:
+                results[i] = (self.label(i),
+                              tuple(results[j] for j in self.children(i)))
+        return results[0]
+
+    @classmethod
+    def from_tree(cls, tree):
+        """
+        Build a FlatTree from a tree of tuples, where every leaf is the value
+        of one token.
+        """
+        flat = cls()
+        leaves = 0
+        stack = [(tree, -1)]
+        open_nodes = []  # (number, end of its subtree in the stack)
+        while stack:
+            t, parent = stack.pop()
+            while open_nodes and open_nodes[-1][1] > len(stack):
+                flat.close(open_nodes.pop()[0], leaves)
+            if type(t) is not tuple:
+                flat.add(t, parent, 1, leaves)
+                leaves += 1
+                continue
+            i = flat.add(t[0], parent, 0, leaves)
+            open_nodes.append((i, len(stack)))
+            stack.extend((c, i) for c in reversed(t[1]))
+        while open_nodes:
+            flat.close(open_nodes.pop()[0], leaves)
+        return flat
+
+
+class FlatTreeParser(JsonParser):
+    """
+    A JSON parser that builds a FlatTree directly, without building the
+    tree of tuples. It makes the same decisions (and raises the same
+    SyntaxErrors) as JsonParser.
+    """
+    def __init__(self, tokens):
+        self.tree = FlatTree()
+        self.open_nodes = []
+        JsonParser.__init__(self, tokens)
+
+    def open(self, label):
+        parent = self.open_nodes[-1] if self.open_nodes else -1
+        self.open_nodes.append(self.tree.add(label, parent, 0, self.pos))
+
+    def close(self):
+        self.tree.close(self.open_nodes.pop(), self.pos)
+
+    def leaf(self, terminal):
+        start = self.pos
+        self.tree.add(self.match(terminal), self.open_nodes[-1], 1, start)
+
+    def error(self):
+        return SyntaxError("Syntax error: no rule for token: {}".format(self.t))
+
+    def parse(self):
+        """
+        Parse the input, and return it as a FlatTree.
+        """
+        self.parse_obj()
+        self.match(EOF)
+        return self.tree
+
+    def parse_obj(self):
+        if self.t != LB:
+            raise self.error()
+        self.open(obj)
+        self.leaf(LB)
+        self.parse_E()
+        self.leaf(RB)
+        self.close()
+
+    def parse_E(self):
+        if self.t == STRING:
+            self.open(E)
+            self.parse_members()
+            self.close()
+        elif self.t == RB:
+            self.open(E)
+            self.close()
+        else:
+            raise self.error()
+
+    def parse_members(self):
+        if self.t != STRING:
+            raise self.error()
+        self.open(members)
+        self.parse_keyvalue()
+        self.parse_MembersTag()
+        self.close()
+
+    def parse_MembersTag(self):
+        # the chain of nested MembersTag nodes is opened in a loop, and
+        # closed once the final (epsilon) MembersTag is reached
+        depth = 0
+        while self.t == COMMA:
+            self.open(MembersTag)
+            self.leaf(COMMA)
+            self.parse_keyvalue()
+            depth += 1
+        if self.t != RB:
+            raise self.error()
+        self.open(MembersTag)
+        self.close()
+        for _ in range(depth):
+            self.close()
+
+    def parse_keyvalue(self):
+        if self.t != STRING:
+            raise self.error()
+        self.open(keyvalue)
+        self.leaf(STRING)
+        self.leaf(COLON)
+        self.parse_value()
+        self.close()
+
+    def parse_value(self):
+        if self.t == STRING or self.t == INT:
+            self.open(value)
+            self.leaf(self.t)
+            self.close()
+        elif self.t == LB:
+            self.open(value)
+            self.parse_obj()
+            self.close()
+        else:
+            raise self.error()
@@ -0,0 +1,236 @@
+"""
+This module contains a cache of grammar analysis results.
+
+The results (terminals, nonterminals, NULLABLE, FIRST, FOLLOW, SELECT, the
+LL(1) conflicts and the LL(1) parsing table) are keyed by a hash of the
+rules of the grammar, kept in memory (evicting the least recently used
+grammars), and stored on disk in marshal format, so that a new process
+analyzing an unchanged grammar only reads a file.
+
+To keep the files compact, symbol names are interned (marshal writes an
+interned string once, and refers back to it), and the table maps to rule
+indices instead of copies of the rules.
+"""
+
+import hashlib
+import marshal
+import os
+import tempfile
+from collections import OrderedDict
+
+from grammar import calculate_select, find_terminals_and_nonterminals, format_rule
+from grammar_digraph import calculate_first, calculate_follow
+from grammar_worklist import calculate_nullable
+from ll1 import GrammarError, table_from_select
+
+
+# bump when the format of the results changes, to ignore old cache files
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 '.grammar_cache')
+
+
+def grammar_key(grammar):
+    """
+    Return the hex digest of the canonical form of the grammar (the rules
+    in order, as tuples of strings).
+    """
+    rules = tuple((head, tuple(body)) for head, body in grammar)
+    return hashlib.sha1(repr((CACHE_VERSION, rules))).hexdigest()
+
+
+def compute_analysis(grammar):
+    """
+    Analyze the grammar, and return a dictionary with the keys 'terminals',
+    'nonterminals', 'nullable', 'first', 'follow', 'select', 'conflicts'
+    (the list of pairs of rules with intersecting SELECT sets) and 'table'
+    (the LL(1) parsing table, or None if the grammar is not LL(1)).
+    """
+    grammar = [(intern(head), tuple(intern(symbol) for symbol in body))
+               for head, body in grammar]
+    terminals, nonterminals = find_terminals_and_nonterminals(grammar)
+    nullable = calculate_nullable(terminals, nonterminals, grammar)
+    first = calculate_first(terminals, nonterminals, grammar, nullable)
+    follow = calculate_follow(terminals, nonterminals, grammar, nullable, first)
+    select = calculate_select(terminals, nonterminals, grammar, nullable, first, follow)
+
+    conflicts = []
+    rules = dict()  # nonterminal -> its rules so far
+    for rule in grammar:
+        for other in rules.get(rule[0], ()):
+            if select[rule] & select[other]:
+                conflicts.append((other, rule))
+        rules.setdefault(rule[0], []).append(rule)
+    try:
+        table = table_from_select(grammar, select)
+    except GrammarError:
+        table = None
+
+    return {
+        'terminals': terminals,
+        'nonterminals': nonterminals,
+        'nullable': nullable,
+        'first': first,
+        'follow': follow,
+        'select': select,
+        'conflicts': conflicts,
+        'table': table,
+    }
+
+
+class GrammarCache(object):
+    """
+    A cache of analysis results, holding up to capacity grammars in memory,
+    and all of them in files in directory (if directory is not None).
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, capacity=32):
+        self.directory = directory
+        self.capacity = capacity
+        self.memory = OrderedDict()  # key -> results, least recently used first
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.marshal')
+
+    def analyze(self, grammar):
+        """
+        Return the results of compute_analysis(grammar), from the cache if
+        possible. The results are shared, and must not be modified.
+        """
+        key = grammar_key(grammar)
+        results = self.memory.pop(key, None)
+        if results is None:
+            results = self.load(key, grammar)
+        if results is None:
+            results = compute_analysis(grammar)
+            self.store(key, results, grammar)
+        self.memory[key] = results
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+        return results
+
+    def load(self, key, grammar):
+        """
+        Return the results for grammar stored on disk under key, or None.
+        """
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key), 'rb') as f:
+                results = marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError):
+            return None
+        if results['table'] is not None:
+            results['table'] = dict((entry, grammar[i])
+                                    for entry, i in results['table'].iteritems())
+        return results
+
+    def store(self, key, results, grammar):
+        """
+        Write the results to disk under key. The file is written under a
+        temporary name and renamed, so concurrent processes never read a
+        partial file.
+        """
+        if self.directory is None:
+            return
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            stored = dict(results)
+            if results['table'] is not None:
+                index = dict((rule, i) for i, rule in enumerate(grammar))
+                stored['table'] = dict((entry, index[rule])
+                                       for entry, rule in results['table'].iteritems())
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(stored, f)
+            os.rename(temp, self.path(key))
+        except (IOError, OSError):
+            pass  # the cache is only an optimization
+
+    def clear(self):
+        """
+        Remove all the results, in memory and on disk.
+        """
+        self.memory.clear()
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.marshal'):
+                os.remove(os.path.join(self.directory, name))
+
+
+default_cache = GrammarCache()
+
+
+def build_table(grammar, cache=None):
+    """
+    Like ll1.build_table, using the cache (by default, default_cache).
+    """
+    results = (cache or default_cache).analyze(grammar)
+    if results['table'] is None:
+        r1, r2 = results['conflicts'][0]
+        raise GrammarError(
+            "Grammar is not LL(1), as the following rules have "
+            "intersecting SELECT sets: {} and {}".format(
+                format_rule(r1), format_rule(r2)))
+    return results['table']
+
+
+def analyze_grammar(grammar, cache=None):
+    """
+    Like grammar.analyze_grammar, using the cache (by default,
+    default_cache).
+    """
+    results = (cache or default_cache).analyze(grammar)
+    print "Analyzing grammar:"
+    for r in grammar:
+        print "    " + format_rule(r)
+    print
+
+    print "terminals = ", results['terminals']
+    print "nonterminals = ", results['nonterminals']
+    print
+
+    print "nullable = ", results['nullable']
+    print
+
+    for name in ('first', 'follow'):
+        sets = results[name]
+        for k in sorted(sets.keys()):
+            print "{}({}) = {}".format(name, k, sets[k])
+        print
+
+    select = results['select']
+    for k in sorted(select.keys()):
+        print "select({}) = {}".format(format_rule(k), select[k])
+    print
+
+    for r1, r2 in results['conflicts']:
+        print "Grammar is not LL(1), as the following rules have intersecting SELECT sets:"
+        print "    " + format_rule(r1)
+        print "    " + format_rule(r2)
+    if not results['conflicts']:
+        print "Grammar is LL(1)."
+    print
+
+
+if __name__ == '__main__':
+    import time
+    from grammar import grammar_json_4c
+    from grammar_digraph import cyclic_grammar
+    from grammar_worklist import synthetic_grammar
+
+    cache = GrammarCache(capacity=4)
+    cache.clear()
+    for name, grammar in (('grammar_json_4c', grammar_json_4c),
+                          ('synthetic_grammar(400)', synthetic_grammar(400)),
+                          ('cyclic_grammar(400)', cyclic_grammar(400))):
+        timings = []
+        for step in ('cold', 'disk', 'memory'):
+            if step == 'disk':
+                cache.memory.clear()
+            start = time.time()
+            cache.analyze(grammar)
+            timings.append(time.time() - start)
+        print "{}: cold {:.4f}s, warm from disk {:.4f}s, from memory {:.6f}s".format(
+            name, *timings)
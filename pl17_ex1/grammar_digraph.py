@@ -0,0 +1,153 @@
+"""
+This module contains the computation of the FIRST and FOLLOW sets of a
+grammar (in the format of grammar.py) with the digraph algorithm of
+DeRemer and Pennello.
+
+Both analyses have the form
+    F(x) = F'(x) | union of F(y) for all y with x R y
+for a relation R between nonterminals (FIRST(A) includes FIRST(X) if
+A -> alpha X beta with alpha nullable, FOLLOW(X) includes FOLLOW(A) if
+A -> alpha X beta with beta nullable). The digraph algorithm finds the
+strongly connected components of R with Tarjan's algorithm, and computes
+each set once per component, so the time is linear in the size of R (times
+the cost of a union), however long the chains and cycles of R are.
+
+The functions take the same arguments and return the same results as their
+counterparts in grammar_worklist.py.
+"""
+
+from grammar_worklist import calculate_nullable, first_edges, follow_edges
+from symbols import *
+
+
+INFINITY = float('inf')
+
+
+def digraph(nodes, relation, sets, copy=set):
+    """
+    Compute F(x) = sets[x] | union of F(y) for all y in relation[x], for
+    every x in nodes, updating sets in place. The values of sets can be
+    anything with |; copy makes an independent copy of one (for immutable
+    values, such as the ints of grammar_bitset.py, it can return it as is).
+
+    The traversal is iterative, so long chains in the relation do not hit
+    the recursion limit.
+    """
+    number = dict.fromkeys(nodes, 0)
+    stack = []
+    for root in nodes:
+        if number[root] != 0:
+            continue
+        stack.append(root)
+        number[root] = len(stack)
+        calls = [(root, len(stack), iter(relation.get(root, ())))]
+        while calls:
+            x, depth, successors = calls[-1]
+            for y in successors:
+                if number[y] == 0:
+                    stack.append(y)
+                    number[y] = len(stack)
+                    calls.append((y, len(stack), iter(relation.get(y, ()))))
+                    break
+                number[x] = min(number[x], number[y])
+                sets[x] |= sets[y]
+            else:
+                calls.pop()
+                if number[x] == depth:
+                    # x is the root of a strongly connected component
+                    while True:
+                        top = stack.pop()
+                        number[top] = INFINITY
+                        if top == x:
+                            break
+                        sets[top] = copy(sets[x])
+                if calls:
+                    parent = calls[-1][0]
+                    number[parent] = min(number[parent], number[x])
+                    sets[parent] |= sets[x]
+
+
+def invert(edges):
+    """
+    Return the inverse of a relation given as a dictionary of sets.
+    """
+    inverse = dict((x, set()) for x in edges)
+    for x, targets in edges.items():
+        for y in targets:
+            inverse.setdefault(y, set()).add(x)
+    return inverse
+
+
+def calculate_first(terminals, nonterminals, grammar, nullable):
+    """
+    Return a dictionary mapping terminals and nonterminals to their FIRST set
+    """
+    edges, direct = first_edges(terminals, nonterminals, grammar, nullable)
+    first = dict((a, set(direct[a])) for a in nonterminals)
+    # edges maps X to the A with FIRST(X) in FIRST(A), so A R X is the inverse
+    digraph(nonterminals, invert(edges), first)
+    for t in terminals:
+        first[t] = {t}
+    return first
+
+
+def calculate_follow(terminals, nonterminals, grammar, nullable, first):
+    """
+    Return a dictionary mapping terminals and nonterminals to their FOLLOW set
+    """
+    edges, direct = follow_edges(terminals, nonterminals, grammar, nullable, first)
+    follow = dict((a, set(direct[a])) for a in nonterminals)
+    follow[grammar[0][0]].add(EOF)
+    # edges maps A to the X with FOLLOW(A) in FOLLOW(X), so X R A is the inverse
+    digraph(nonterminals, invert(edges), follow)
+    return follow
+
+
+def cyclic_grammar(n):
+    """
+    Return a grammar with a cycle of n mutually recursive nonterminals
+    (each FIRST and FOLLOW set in the cycle contains all of the others),
+    listed so that a full sweep over the rules only moves information one
+    link along the cycle.
+    """
+    grammar = [('S', ('C0', 'end'))]
+    for i in range(n):
+        # C{i} -> C{i+1} c{i} D{i} | t{i} and D{i} -> C{i-1} | epsilon
+        grammar.append(('C{}'.format(i), ('C{}'.format((i + 1) % n), 'c{}'.format(i), 'D{}'.format(i))))
+        grammar.append(('C{}'.format(i), ('t{}'.format(i),)))
+        grammar.append(('D{}'.format(i), ('C{}'.format((i - 1) % n),)))
+        grammar.append(('D{}'.format(i), ()))
+    return grammar
+
+
+def benchmark(sizes=(50, 100, 200, 400)):
+    """
+    Time the analyses of grammar.py, grammar_worklist.py and this module on
+    cyclic grammars of growing size, and print the timings.
+    """
+    import sys
+    import time
+    import grammar as sweep
+    import grammar_worklist as worklist
+
+    print "{:>6} {:>7} {:>12} {:>12} {:>12}".format(
+        'n', 'rules', 'sweep (s)', 'worklist (s)', 'digraph (s)')
+    for n in sizes:
+        grammar = cyclic_grammar(n)
+        terminals, nonterminals = sweep.find_terminals_and_nonterminals(grammar)
+        timings = []
+        results = []
+        for module in (sweep, worklist, sys.modules[__name__]):
+            start = time.time()
+            nullable = module.calculate_nullable(terminals, nonterminals, grammar)
+            first = module.calculate_first(terminals, nonterminals, grammar, nullable)
+            follow = module.calculate_follow(terminals, nonterminals, grammar, nullable, first)
+            timings.append(time.time() - start)
+            results.append((nullable, first, follow))
+        assert results[0] == results[1] == results[2]
+        print "{:>6} {:>7} {:>12.4f} {:>12.4f} {:>12.4f}".format(
+            n, len(grammar), *timings)
+
+
+if __name__ == '__main__':
+    benchmark()
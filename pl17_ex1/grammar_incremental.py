@@ -0,0 +1,367 @@
+"""
+This module contains an analysis of a grammar (in the format of
+grammar.py) that is kept up to date as rules are added or removed.
+
+Every rule contributes to the sets of the analysis:
+- to FIRST, terminals of its head, and edges "FIRST(X) is contained in
+  FIRST(head)" for the nonterminals X of its nullable prefix;
+- to FOLLOW, terminals of the nonterminals of its body (FIRST of the rest
+  of the body), and edges "FOLLOW(head) is contained in FOLLOW(X)" for the
+  nonterminals X of its nullable suffix.
+The contributions are counted per rule, so removing a rule takes exactly
+its contributions away.
+
+Adding a rule only makes sets grow, so the growth is propagated with the
+worklist of grammar_worklist.py. Removing a rule can make sets shrink, so
+the sets that can depend on the rule are recomputed, from the sets that
+cannot. When the edit turns a terminal into a nonterminal or back, or
+changes the start symbol, everything is recomputed.
+"""
+
+from grammar import find_terminals_and_nonterminals, format_rule
+from grammar_worklist import calculate_nullable, propagate
+from symbols import *
+
+
+def count(counts, key, items, step):
+    """
+    Add step to counts[key][item] for every item, dropping the items that
+    reach 0.
+    """
+    d = counts.setdefault(key, dict())
+    for item in items:
+        n = d.get(item, 0) + step
+        if n:
+            d[item] = n
+        else:
+            del d[item]
+
+
+class GrammarAnalysis(object):
+    """
+    The NULLABLE, FIRST, FOLLOW and SELECT sets of a grammar, given as a
+    list of distinct rules, as attributes with the same contents the
+    functions of grammar_worklist.py and grammar.calculate_select return.
+    """
+    def __init__(self, grammar):
+        self.grammar = [(head, tuple(body)) for head, body in grammar]
+        self.recompute()
+
+    def recompute(self):
+        """
+        Analyze the whole grammar from scratch.
+        """
+        grammar = self.grammar
+        self.terminals, self.nonterminals = find_terminals_and_nonterminals(grammar)
+        self.rules = dict((a, []) for a in self.nonterminals)  # head -> rules
+        self.uses = dict()  # symbol -> rules with it in their body
+        for rule in grammar:
+            self.rules[rule[0]].append(rule)
+            for symbol in rule[1]:
+                self.uses.setdefault(symbol, set()).add(rule)
+        self.nullable = calculate_nullable(self.terminals, self.nonterminals, grammar)
+
+        # contributions of rules, see the module docstring
+        self.first_contrib = dict()  # rule -> (sources, terminals)
+        self.first_edges = dict()  # X -> {A: count} for FIRST(X) in FIRST(A)
+        self.first_sources = dict()  # A -> {X: count}
+        self.first_direct = dict()  # A -> {terminal: count}
+        self.follow_contrib = dict()  # rule -> (targets, ((X, terminals), ...))
+        self.follow_edges = dict()  # A -> {X: count} for FOLLOW(A) in FOLLOW(X)
+        self.follow_sources = dict()  # X -> {A: count}
+        self.follow_direct = dict()  # X -> {terminal: count}
+
+        self.first = dict((t, {t}) for t in self.terminals)
+        for rule in grammar:
+            self.set_first_contrib(rule)
+        for a in self.nonterminals:
+            self.first[a] = set(self.first_direct.get(a, ()))
+        propagate(self.first, self.first_edges,
+                  dict((a, set(self.first[a])) for a in self.nonterminals))
+
+        self.follow = dict()
+        for rule in grammar:
+            self.set_follow_contrib(rule)
+        for a in self.nonterminals:
+            self.follow[a] = set(self.follow_direct.get(a, ()))
+        if grammar:
+            self.follow[grammar[0][0]].add(EOF)
+        propagate(self.follow, self.follow_edges,
+                  dict((a, set(self.follow[a])) for a in self.nonterminals))
+
+        self.select = dict((rule, self.calculate_select(rule)) for rule in grammar)
+
+    def set_first_contrib(self, rule, new=True):
+        """
+        Replace the FIRST contribution of the rule by the one given by the
+        current NULLABLE set (or remove it, if new is false).
+        """
+        head, body = rule
+        old = self.first_contrib.pop(rule, None)
+        if old is not None:
+            for x in old[0]:
+                count(self.first_edges, x, (head,), -1)
+            count(self.first_sources, head, old[0], -1)
+            count(self.first_direct, head, old[1], -1)
+        if not new:
+            return
+        sources = []
+        terminals = ()
+        for symbol in body:
+            if symbol in self.terminals:
+                terminals = (symbol,)
+                break
+            sources.append(symbol)
+            if symbol not in self.nullable:
+                break
+        for x in sources:
+            count(self.first_edges, x, (head,), 1)
+        count(self.first_sources, head, sources, 1)
+        count(self.first_direct, head, terminals, 1)
+        self.first_contrib[rule] = (sources, terminals)
+
+    def set_follow_contrib(self, rule, new=True):
+        """
+        Replace the FOLLOW contribution of the rule by the one given by the
+        current NULLABLE and FIRST sets (or remove it, if new is false).
+        """
+        head, body = rule
+        old = self.follow_contrib.pop(rule, None)
+        if old is not None:
+            count(self.follow_edges, head, old[0], -1)
+            for x in old[0]:
+                count(self.follow_sources, x, (head,), -1)
+            for x, terminals in old[1]:
+                count(self.follow_direct, x, terminals, -1)
+        if not new:
+            return
+        targets = []
+        direct = []
+        # walk the body backwards, keeping FIRST of the rest of the body and
+        # whether the rest is nullable
+        rest = set()
+        rest_nullable = True
+        for i in range(len(body) - 1, -1, -1):
+            symbol = body[i]
+            if symbol in self.nonterminals:
+                if rest:
+                    direct.append((symbol, tuple(rest)))
+                if rest_nullable:
+                    targets.append(symbol)
+            if symbol in self.terminals or symbol not in self.nullable:
+                rest = set(self.first[symbol])
+                rest_nullable = False
+            else:
+                rest = rest | self.first[symbol]
+        count(self.follow_edges, head, targets, 1)
+        for x in targets:
+            count(self.follow_sources, x, (head,), 1)
+        for x, terminals in direct:
+            count(self.follow_direct, x, terminals, 1)
+        self.follow_contrib[rule] = (targets, direct)
+
+    def calculate_select(self, rule):
+        """
+        Return the SELECT set of a rule.
+        """
+        head, body = rule
+        result = set()
+        for symbol in body:
+            result |= self.first[symbol]
+            if symbol not in self.nullable:
+                return result
+        return result | self.follow[head]
+
+    def add_rule(self, rule):
+        """
+        Add a rule at the end of the grammar, and update the analysis.
+        Adding a rule that is already in the grammar does nothing.
+        """
+        head, body = rule = (rule[0], tuple(rule[1]))
+        if rule in self.select:
+            return
+        self.grammar.append(rule)
+        if head in self.terminals or len(self.grammar) == 1:
+            self.recompute()
+            return
+
+        if head not in self.nonterminals:
+            self.nonterminals.add(head)
+            self.rules[head] = []
+            self.first[head] = set()
+            self.follow[head] = set()
+        for symbol in body:
+            if symbol not in self.nonterminals and symbol not in self.terminals:
+                self.terminals.add(symbol)
+                self.first[symbol] = {symbol}
+        self.rules[head].append(rule)
+        for symbol in body:
+            self.uses.setdefault(symbol, set()).add(rule)
+
+        # NULLABLE grows by the heads that became nullable
+        grown_nullable = set()
+        worklist = [rule]
+        while worklist:
+            r = worklist.pop()
+            if r[0] not in self.nullable and all(s in self.nullable for s in r[1]):
+                self.nullable.add(r[0])
+                grown_nullable.add(r[0])
+                worklist.extend(self.uses.get(r[0], ()))
+
+        # the contributions of the rules using the new nullable symbols grow
+        changed = set([rule])
+        for a in grown_nullable:
+            changed.update(self.uses.get(a, ()))
+        grown_first = set()
+        delta = dict()
+        for r in changed:
+            self.set_first_contrib(r)
+            head_r = r[0]
+            new = set(self.first_contrib[r][1])
+            for x in self.first_contrib[r][0]:
+                new |= self.first[x]
+            new -= self.first[head_r]
+            if new:
+                self.first[head_r] |= new
+                delta[head_r] = delta.get(head_r, set()) | new
+                grown_first.add(head_r)
+        propagate(self.first, self.first_edges, delta, grown_first)
+
+        # the FOLLOW contributions of the rules using symbols with grown
+        # NULLABLE or FIRST grow
+        for a in grown_first:
+            changed.update(self.uses.get(a, ()))
+        grown_follow = set()
+        delta = dict()
+        for r in changed:
+            self.set_follow_contrib(r)
+            targets, direct = self.follow_contrib[r]
+            additions = [(x, self.follow[r[0]]) for x in targets] + direct
+            for x, terminals in additions:
+                new = set(terminals) - self.follow[x]
+                if new:
+                    self.follow[x] |= new
+                    delta[x] = delta.get(x, set()) | new
+                    grown_follow.add(x)
+        propagate(self.follow, self.follow_edges, delta, grown_follow)
+
+        for a in grown_follow:
+            changed.update(self.rules[a])
+        for r in changed:
+            self.select[r] = self.calculate_select(r)
+
+    def remove_rule(self, rule):
+        """
+        Remove a rule from the grammar, and update the analysis.
+        Raise a ValueError if the rule is not in the grammar.
+        """
+        head, body = rule = (rule[0], tuple(rule[1]))
+        if rule not in self.select:
+            raise ValueError("rule not in grammar: {}".format(format_rule(rule)))
+        index = self.grammar.index(rule)
+        del self.grammar[index]
+        del self.select[rule]
+        self.rules[head].remove(rule)
+        for symbol in body:
+            self.uses[symbol].discard(rule)
+        if not self.rules[head] or (index == 0 and self.grammar[0][0] != head):
+            self.recompute()
+            return
+        for symbol in body:
+            if symbol in self.terminals and not self.uses[symbol]:
+                # only the sets recomputed below can contain it
+                self.terminals.discard(symbol)
+                del self.first[symbol]
+                del self.uses[symbol]
+        self.set_first_contrib(rule, False)
+        self.set_follow_contrib(rule, False)
+
+        # the nonterminals whose NULLABLE and FIRST can depend on the rule:
+        # its head, and the nonterminals using them
+        affected = set([head])
+        worklist = [head]
+        while worklist:
+            for r in self.uses.get(worklist.pop(), ()):
+                if r[0] not in affected:
+                    affected.add(r[0])
+                    worklist.append(r[0])
+        affected_rules = [r for a in affected for r in self.rules[a]]
+
+        # NULLABLE, over the rules of the affected nonterminals
+        self.nullable -= affected
+        remaining = dict()  # rule -> number of body symbols not yet nullable
+        worklist = []
+        for r in affected_rules:
+            remaining[r] = sum(1 for s in r[1] if s not in self.nullable)
+            if remaining[r] == 0:
+                worklist.append(r[0])
+        while worklist:
+            a = worklist.pop()
+            if a in self.nullable:
+                continue
+            self.nullable.add(a)
+            for r in self.uses.get(a, ()):
+                if r in remaining:
+                    remaining[r] -= sum(1 for s in r[1] if s == a)
+                    if remaining[r] == 0:
+                        worklist.append(r[0])
+
+        # FIRST, from the FIRST sets of the unaffected nonterminals
+        for r in affected_rules:
+            self.set_first_contrib(r)
+        for a in affected:
+            self.first[a] = set(self.first_direct.get(a, ()))
+            for x in self.first_sources.get(a, ()):
+                if x not in affected:
+                    self.first[a] |= self.first[x]
+        propagate(self.first, self.first_edges,
+                  dict((a, set(self.first[a])) for a in affected))
+
+        # FOLLOW, of the nonterminals in the bodies of the changed rules and
+        # the nonterminals whose FOLLOW contains theirs
+        for r in affected_rules:
+            self.set_follow_contrib(r)
+        follow_affected = set(s for r in affected_rules + [rule] for s in r[1]
+                              if s in self.nonterminals)
+        worklist = list(follow_affected)
+        while worklist:
+            for x in self.follow_edges.get(worklist.pop(), ()):
+                if x not in follow_affected:
+                    follow_affected.add(x)
+                    worklist.append(x)
+        start = self.grammar[0][0]
+        for x in follow_affected:
+            self.follow[x] = set(self.follow_direct.get(x, ()))
+            if x == start:
+                self.follow[x].add(EOF)
+            for a in self.follow_sources.get(x, ()):
+                if a not in follow_affected:
+                    self.follow[x] |= self.follow[a]
+        propagate(self.follow, self.follow_edges,
+                  dict((x, set(self.follow[x])) for x in follow_affected))
+
+        for a in affected | follow_affected:
+            for r in self.rules[a]:
+                self.select[r] = self.calculate_select(r)
+
+
+if __name__ == '__main__':
+    import time
+    from grammar_cache import compute_analysis
+    from grammar_worklist import synthetic_grammar
+
+    grammar = synthetic_grammar(400)
+    start = time.time()
+    analysis = GrammarAnalysis(grammar)
+    print "full analysis of {} rules: {:.4f}s".format(len(grammar), time.time() - start)
+    for rule in (grammar[1], grammar[2], grammar[len(grammar) - 4]):
+        start = time.time()
+        analysis.remove_rule(rule)
+        removed = time.time() - start
+        start = time.time()
+        analysis.add_rule(rule)
+        added = time.time() - start
+        print "{}: remove {:.4f}s, add {:.4f}s".format(format_rule(rule), removed, added)
+    expected = compute_analysis(analysis.grammar)
+    for name in ('nullable', 'first', 'follow', 'select'):
+        assert getattr(analysis, name) == expected[name]
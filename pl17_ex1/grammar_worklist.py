@@ -0,0 +1,210 @@
+"""
+This module contains a worklist-driven engine for computing the NULLABLE,
+FIRST and FOLLOW sets of a grammar (in the format of grammar.py).
+
+Instead of sweeping over all the rules until nothing changes, each
+analysis builds the dependencies between symbols once, and then only
+propagates what changed: when a set grows, just the new elements are
+pushed to the sets that depend on it.
+
+The functions take the same arguments and return the same results as
+their counterparts in grammar.py. (calculate_follow follows the textbook
+definition; on grammars where a nullable nonterminal is followed by more
+symbols, the loop in grammar.calculate_follow can skip a symbol.)
+"""
+
+from collections import deque
+
+from symbols import *
+
+
+def calculate_nullable(terminals, nonterminals, grammar):
+    """
+    Return the set of nullable nonterminals in the given grammar.
+
+    Every rule counts the symbols of its body not yet known to be nullable;
+    when a nonterminal becomes nullable, only the rules it appears in are
+    updated.
+    """
+    remaining = []  # rule index -> number of body symbols not yet nullable
+    occurrences = dict((a, []) for a in nonterminals)  # symbol -> rule indices
+    for i, (head, body) in enumerate(grammar):
+        remaining.append(len(body))
+        for symbol in body:
+            if symbol in nonterminals:
+                occurrences[symbol].append(i)
+
+    nullable = set()
+    worklist = deque()
+    for i, (head, body) in enumerate(grammar):
+        if not body and head not in nullable:
+            nullable.add(head)
+            worklist.append(head)
+    while worklist:
+        symbol = worklist.popleft()
+        for i in occurrences[symbol]:
+            remaining[i] -= 1
+            head = grammar[i][0]
+            if remaining[i] == 0 and head not in nullable:
+                nullable.add(head)
+                worklist.append(head)
+    return nullable
+
+
+def propagate(sets, edges, delta, changed=None):
+    """
+    Propagate set elements along edges until nothing changes.
+
+    sets maps symbols to sets, edges maps a symbol X to the symbols whose
+    sets must contain sets[X], and delta maps symbols to the elements that
+    were added to their sets and not propagated yet. sets is updated in
+    place, and the symbols whose sets grew are added to changed (if given).
+    """
+    worklist = deque(symbol for symbol in delta if delta[symbol])
+    queued = set(worklist)
+    while worklist:
+        symbol = worklist.popleft()
+        queued.discard(symbol)
+        added = delta.pop(symbol)
+        for target in edges.get(symbol, ()):
+            new = added - sets[target]
+            if new:
+                sets[target] |= new
+                if changed is not None:
+                    changed.add(target)
+                if target in delta:
+                    delta[target] |= new
+                else:
+                    delta[target] = new
+                if target not in queued:
+                    queued.add(target)
+                    worklist.append(target)
+
+
+def first_edges(terminals, nonterminals, grammar, nullable):
+    """
+    Return a dictionary mapping every nonterminal X to the set of the
+    nonterminals A with a rule A -> alpha X beta, where alpha is nullable
+    (so FIRST(X) is contained in FIRST(A)), and a dictionary mapping every
+    nonterminal to the terminals that directly start its rules.
+    """
+    edges = dict((a, set()) for a in nonterminals)
+    direct = dict((a, set()) for a in nonterminals)
+    for head, body in grammar:
+        for symbol in body:
+            if symbol in terminals:
+                direct[head].add(symbol)
+                break
+            edges[symbol].add(head)
+            if symbol not in nullable:
+                break
+    return edges, direct
+
+
+def calculate_first(terminals, nonterminals, grammar, nullable):
+    """
+    Return a dictionary mapping terminals and nonterminals to their FIRST set
+    """
+    first = dict()
+    for t in terminals:
+        first[t] = {t}
+    edges, direct = first_edges(terminals, nonterminals, grammar, nullable)
+    for a in nonterminals:
+        first[a] = set(direct[a])
+    propagate(first, edges, dict((a, set(direct[a])) for a in nonterminals))
+    return first
+
+
+def follow_edges(terminals, nonterminals, grammar, nullable, first):
+    """
+    Return a dictionary mapping every nonterminal A to the set of the
+    nonterminals X with a rule A -> alpha X beta, where beta is nullable
+    (so FOLLOW(A) is contained in FOLLOW(X)), and a dictionary mapping every
+    nonterminal X to the union of FIRST(beta) over the rules
+    A -> alpha X beta.
+    """
+    edges = dict((a, set()) for a in nonterminals)
+    direct = dict((a, set()) for a in nonterminals)
+    for head, body in grammar:
+        # walk the body backwards, keeping FIRST of the rest of the body and
+        # whether the rest is nullable
+        rest = set()
+        rest_nullable = True
+        for i in range(len(body) - 1, -1, -1):
+            symbol = body[i]
+            if symbol in nonterminals:
+                direct[symbol] |= rest
+                if rest_nullable:
+                    edges[head].add(symbol)
+            if symbol in terminals or symbol not in nullable:
+                rest = set(first[symbol])
+                rest_nullable = False
+            else:
+                rest = rest | first[symbol]
+    return edges, direct
+
+
+def calculate_follow(terminals, nonterminals, grammar, nullable, first):
+    """
+    Return a dictionary mapping terminals and nonterminals to their FOLLOW set
+    """
+    edges, direct = follow_edges(terminals, nonterminals, grammar, nullable, first)
+    follow = dict()
+    for a in nonterminals:
+        follow[a] = set(direct[a])
+    follow[grammar[0][0]].add(EOF)
+    propagate(follow, edges, dict((a, set(follow[a])) for a in nonterminals))
+    return follow
+
+
+def synthetic_grammar(n):
+    """
+    Return a grammar with about 4n rules, with chains of n nonterminals
+    ordered so that a full sweep over the rules only moves information one
+    link along a chain.
+    """
+    grammar = [('S', ('A0',))]
+    for i in range(n):
+        # FIRST(A{i+1}) is contained in FIRST(Ai)
+        grammar.append(('A{}'.format(i), ('A{}'.format(i + 1), 'a{}'.format(i))))
+        grammar.append(('A{}'.format(i), ('x{}'.format(i), 'B{}'.format(n - 1 - i))))
+    grammar.append(('A{}'.format(n), ('c',)))
+    for i in range(n - 1, -1, -1):
+        # FOLLOW(Bi) is contained in FOLLOW(B{i+1})
+        grammar.append(('B{}'.format(i), ('y{}'.format(i), 'B{}'.format(i + 1))))
+        grammar.append(('B{}'.format(i), ()))
+    grammar.append(('B{}'.format(n), ('c',)))
+    return grammar
+
+
+def benchmark(sizes=(50, 100, 200, 400)):
+    """
+    Time the analyses of grammar.py and of this module on synthetic
+    grammars of growing size, and print the timings.
+    """
+    import sys
+    import time
+    import grammar as sweep
+
+    print "{:>6} {:>7} {:>12} {:>12} {:>8}".format(
+        'n', 'rules', 'sweep (s)', 'worklist (s)', 'speedup')
+    for n in sizes:
+        grammar = synthetic_grammar(n)
+        terminals, nonterminals = sweep.find_terminals_and_nonterminals(grammar)
+        timings = []
+        results = []
+        for module in (sweep, sys.modules[__name__]):
+            start = time.time()
+            nullable = module.calculate_nullable(terminals, nonterminals, grammar)
+            first = module.calculate_first(terminals, nonterminals, grammar, nullable)
+            follow = module.calculate_follow(terminals, nonterminals, grammar, nullable, first)
+            timings.append(time.time() - start)
+            results.append((nullable, first, follow))
+        assert results[0] == results[1]
+        print "{:>6} {:>7} {:>12.4f} {:>12.4f} {:>7.1f}x".format(
+            n, len(grammar), timings[0], timings[1],
+            timings[0] / max(timings[1], 1e-9))
+
+
+if __name__ == '__main__':
+    benchmark()
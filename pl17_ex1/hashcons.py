@@ -0,0 +1,62 @@
+"""
+This module contains hash-consing of parse trees: structurally identical
+subtrees are replaced by a single shared one, turning the tree into a DAG.
+
+A node is looked up by its label and the identities of its children, which
+are themselves shared already, so interning a node costs time proportional
+to its number of children and not to the size of its subtree.
+"""
+
+
+class HashConsTable(object):
+    """
+    A table of shared leaves (token values) and nodes of the form
+    (label, (child1, child2, ..., childN)).
+    A table can be shared by several trees.
+    """
+    def __init__(self):
+        self.leaves = dict()  # value -> shared value
+        self.nodes = dict()  # (label, id(child1), ..., id(childN)) -> node
+        self.shared = set()  # ids of the nodes in self.nodes
+
+    def leaf(self, value):
+        """
+        Return the shared leaf equal to value.
+        """
+        return self.leaves.setdefault(value, value)
+
+    def node(self, label, children):
+        """
+        Return the shared node with the given label and children. Children
+        that are not shared yet are interned first.
+        """
+        children = tuple(self.intern(c) for c in children)
+        key = (label,) + tuple(id(c) for c in children)
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = (label, children)
+            self.shared.add(id(node))
+        return node
+
+    def intern(self, tree):
+        """
+        Return the shared version of a tree (or a leaf).
+        """
+        if type(tree) is not tuple:
+            return self.leaf(tree)
+        if id(tree) in self.shared:
+            return tree
+        # intern bottom up, without recursion
+        stack = [(tree, False)]
+        done = dict()  # id(subtree) -> shared subtree
+        while stack:
+            t, expanded = stack.pop()
+            if type(t) is not tuple or id(t) in self.shared or id(t) in done:
+                continue
+            if expanded:
+                done[id(t)] = self.node(t[0], tuple(
+                    done.get(id(c), c) for c in t[1]))
+            else:
+                stack.append((t, True))
+                stack.extend((c, False) for c in t[1])
+        return done[id(tree)]
@@ -0,0 +1,449 @@
+"""
+This module contains incremental re-lexing and re-parsing of a JSON text
+after an edit.
+
+An edit is a triple (offset, deleted, inserted): the deleted characters
+starting at offset are replaced by the inserted text.
+
+Re-lexing starts at the first token the edit can touch, and stops as soon
+as a new token starts where an old token started after the edited region,
+since from there on the lexer sees the same text as before. The offsets of
+the tokens after the edit are shifted lazily (see ShiftedTokenStream), so
+they are not rewritten on every edit.
+
+Re-parsing starts at the smallest subtree holding the changed tokens, and
+reuses every obj and keyvalue subtree, and every rest of a chain of
+MembersTag nodes, whose tokens (and the token after them) were not touched
+by the edit. The parse of such a subtree only looks at those tokens, so the
+old subtree is exactly what a fresh parse would build. Nodes only record
+their number of tokens, not their position, so moving them costs nothing;
+the nodes above the re-parsed subtree are rebuilt.
+"""
+
+from array import array
+from bisect import bisect_right
+
+from lexer import token_regex
+from parser import JsonParser, SyntaxError
+from scanner import LexError, WHITESPACE, compile_scanner, scan_stream
+from symbols import *
+from token_stream import TokenStream
+
+
+class ShiftedTokenStream(TokenStream):
+    """
+    A TokenStream (without encoding) whose stored offsets may be off: the
+    offsets of the tokens from bounds[k] up to bounds[k + 1] are to be
+    shifted by shifts[k]. Once there are more than MAX_SHIFTS pieces, the
+    offsets are rewritten.
+    """
+    MAX_SHIFTS = 256
+
+    def __init__(self, source):
+        TokenStream.__init__(self, source)
+        self.bounds = [0]
+        self.shifts = [0]
+
+    @classmethod
+    def from_stream(cls, tokens):
+        """
+        Return a ShiftedTokenStream sharing the arrays of a TokenStream.
+        """
+        result = cls(tokens.source)
+        result.terminals = tokens.terminals
+        result.codes = tokens.codes
+        result.kinds = tokens.kinds
+        result.starts = tokens.starts
+        result.ends = tokens.ends
+        return result
+
+    def shift(self, i):
+        return self.shifts[bisect_right(self.bounds, i) - 1]
+
+    def start(self, i):
+        return self.starts[i] + self.shift(i)
+
+    def end(self, i):
+        return self.ends[i] + self.shift(i)
+
+    def span(self, i):
+        shift = self.shift(i)
+        return self.starts[i] + shift, self.ends[i] + shift
+
+    def value(self, i):
+        start, end = self.span(i)
+        return self.source[start:end]
+
+    def view(self, i):
+        if self._view is None:
+            self._view = memoryview(self.source)
+        start, end = self.span(i)
+        return self._view[start:end]
+
+    def line_column(self, i):
+        if i < len(self.kinds):
+            start = self.start(i)
+        else:
+            start = len(self.source)
+        if self._lines is None:
+            from positions import LineIndex
+            self._lines = LineIndex(self.source)
+        return self._lines.line_column(start)
+
+    def search(self, offsets, offset, lo=0):
+        """
+        Return the first index i >= lo with offsets[i], shifted, at least
+        offset (offsets is self.starts or self.ends).
+        """
+        hi = len(self.kinds)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if offsets[mid] + self.shift(mid) < offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def set_shifts(self, pieces):
+        """
+        Set the pieces from a list of (bound, shift) pairs in order of
+        bound, dropping empty and redundant ones.
+        """
+        bounds = self.bounds = []
+        shifts = self.shifts = []
+        n = len(self.kinds)
+        for k, (bound, shift) in enumerate(pieces):
+            if bound >= n or (k + 1 < len(pieces) and pieces[k + 1][0] <= bound):
+                continue
+            if shifts and shifts[-1] == shift:
+                continue
+            bounds.append(bound)
+            shifts.append(shift)
+        if not bounds:
+            bounds.append(0)
+            shifts.append(0)
+        if len(bounds) > self.MAX_SHIFTS:
+            self.apply_shifts()
+
+    def apply_shifts(self):
+        """
+        Rewrite the offsets, so they need no shift.
+        """
+        bounds = self.bounds + [len(self.kinds)]
+        for k, shift in enumerate(self.shifts):
+            if shift:
+                lo, hi = bounds[k], bounds[k + 1]
+                for offsets in (self.starts, self.ends):
+                    offsets[lo:hi] = array(
+                        offsets.typecode, map(shift.__add__, offsets[lo:hi]))
+        self.bounds = [0]
+        self.shifts = [0]
+
+
+def apply_edit(text, offset, deleted, inserted):
+    """
+    Return the text after the given edit.
+    """
+    return text[:offset] + inserted + text[offset + deleted:]
+
+
+def relex(text, tokens, offset, deleted, inserted):
+    """
+    Re-lex text (with its TokenStream tokens) after the given edit.
+
+    Return a tuple (new_text, new_tokens, first, old_resume, new_resume),
+    where new_tokens is a ShiftedTokenStream, the tokens before first are
+    the same in both streams, and tokens[old_resume:] are the same as
+    new_tokens[new_resume:], shifted by the change in length.
+    """
+    if not isinstance(tokens, ShiftedTokenStream):
+        tokens = ShiftedTokenStream.from_stream(tokens)
+    new_text = apply_edit(text, offset, deleted, inserted)
+    delta = len(inserted) - deleted
+    resume_pos = offset + len(inserted)  # end of the edit in new_text
+
+    # the first token that ends at or after the edit may change; lexing
+    # restarts at the end of the token before it
+    first = tokens.search(tokens.ends, offset)
+    pos = tokens.end(first - 1) if first > 0 else 0
+
+    match = compile_scanner(token_regex).match
+    relexed = []
+    old_resume = len(tokens)
+    n = len(new_text)
+    while pos < n:
+        if pos >= resume_pos:
+            j = tokens.search(tokens.starts, pos - delta, first)
+            if j < len(tokens) and tokens.start(j) == pos - delta:
+                old_resume = j
+                break
+        m = match(new_text, pos)
+        if m is None:
+            raise LexError(pos, new_text)
+        token = m.lastgroup
+        if token != WHITESPACE:
+            relexed.append((token, pos, m.end()))
+        pos = m.end()
+
+    # the stored offsets are copied as they are, and the pieces of the
+    # old stream after the edit get the change in length added
+    new_tokens = ShiftedTokenStream(new_text)
+    new_tokens.terminals = list(tokens.terminals)
+    new_tokens.codes = dict(tokens.codes)
+    new_tokens.kinds = tokens.kinds[:first]
+    new_tokens.starts = tokens.starts[:first]
+    new_tokens.ends = tokens.ends[:first]
+    for token, start, end in relexed:
+        new_tokens.append(token, start, end)
+    new_resume = len(new_tokens)
+    new_tokens.kinds.extend(tokens.kinds[old_resume:])
+    new_tokens.starts.extend(tokens.starts[old_resume:])
+    new_tokens.ends.extend(tokens.ends[old_resume:])
+
+    k = bisect_right(tokens.bounds, old_resume) - 1
+    pieces = [(bound, shift) for bound, shift in zip(tokens.bounds, tokens.shifts)
+              if bound < first]
+    pieces.append((first, 0))
+    pieces.append((new_resume, tokens.shifts[k] + delta))
+    pieces.extend((bound - old_resume + new_resume, shift + delta)
+                  for bound, shift in zip(tokens.bounds[k + 1:], tokens.shifts[k + 1:]))
+    new_tokens.set_shifts(pieces)
+    return new_text, new_tokens, first, old_resume, new_resume
+
+
+class OldTreeCursor(object):
+    """
+    Finds the subtrees of an old tree starting at given token indices, for
+    indices that only grow. The tree is walked once, left to right: a stack
+    holds the path from the root to the subtree holding the last index
+    asked for, with the token index each node starts at.
+
+    sizes maps id(node) to the number of tokens of every tuple node.
+    """
+    def __init__(self, tree, start, sizes):
+        self.sizes = sizes
+        self.stack = [(tree, start)]
+
+    def size(self, node):
+        return self.sizes[id(node)] if type(node) is tuple else 1
+
+    def find(self, nonterminal, pos):
+        """
+        Return (tree, end) for the outermost subtree labeled nonterminal that
+        starts at token index pos, or None.
+        """
+        stack = self.stack
+        while stack and stack[-1][1] + self.size(stack[-1][0]) <= pos:
+            stack.pop()
+        while stack:
+            node, start = stack[-1]
+            if start == pos and node[0] == nonterminal:
+                return node, start + self.size(node)
+            # go down to the child holding the token at pos
+            for child in node[1]:
+                end = start + self.size(child)
+                if end > pos:
+                    break
+                start = end
+            else:
+                return None
+            if type(child) is not tuple or start > pos:
+                return None
+            stack.append((child, start))
+        return None
+
+
+class ReusingParser(JsonParser):
+    """
+    A JsonParser that records the number of tokens of every node it builds
+    in sizes (by id), never prints, and can skip over the tokens of old
+    subtrees it is given to reuse.
+
+    reuse is a function (nonterminal, start) -> (tree, end) or None, where
+    start and end are token indices, end being one past the last token. It
+    is asked for obj and keyvalue subtrees, and at every COMMA of a chain of
+    MembersTag nodes for the rest of the chain.
+    """
+    def __init__(self, tokens, sizes=None, reuse=None):
+        self.sizes = dict() if sizes is None else sizes
+        self.reuse = reuse
+        self.reused = set()  # ids of the subtrees that were reused
+        self.built = []  # the nodes that were built
+        JsonParser.__init__(self, tokens)
+        self.set_observer(None)
+
+    def node(self, label, children):
+        tree = JsonParser.node(self, label, children)
+        sizes = self.sizes
+        sizes[id(tree)] = sum(sizes[id(c)] if type(c) is tuple else 1
+                              for c in children)
+        self.built.append(tree)
+        return tree
+
+    def skip_to(self, pos):
+        """
+        Make the token at index pos the current one.
+        """
+        self.pos = pos - 1
+        self.advance()
+
+    def find_reusable(self, nonterminal):
+        found = self.reuse(nonterminal, self.pos) if self.reuse else None
+        if found is not None:
+            tree, end = found
+            self.reused.add(id(tree))
+            self.skip_to(end)
+            return tree
+        return None
+
+    def parse_obj(self):
+        tree = self.find_reusable(obj)
+        return tree if tree is not None else JsonParser.parse_obj(self)
+
+    def parse_keyvalue(self):
+        tree = self.find_reusable(keyvalue)
+        return tree if tree is not None else JsonParser.parse_keyvalue(self)
+
+    def parse_MembersTag(self):
+        """
+        Like JsonParser.parse_MembersTag, stopping at the first COMMA where
+        the rest of the chain can be reused.
+        """
+        children = []
+        result = None
+        while self.t == COMMA:
+            result = self.find_reusable(MembersTag)
+            if result is not None:
+                break
+            children.append(self.match(COMMA))
+            children.append(self.parse_keyvalue())
+        if result is None:
+            if self.t != RB:
+                raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
+            result = self.node(MembersTag, ())
+        for i in range(len(children) - 2, -1, -2):
+            result = self.node(MembersTag, (children[i], children[i + 1], result))
+        return result
+
+
+class IncrementalTree(object):
+    """
+    A JSON text together with its tokens and parse tree, which can be
+    updated after edits.
+
+    Only the number of tokens of each node is kept (in sizes, by id), not
+    its position, so nodes that move after an edit need no update.
+    """
+    def __init__(self, text):
+        self.text = text
+        self.tokens = ShiftedTokenStream.from_stream(scan_stream(text))
+        parser = ReusingParser(self.tokens)
+        self.tree = parser.parse()
+        self.sizes = parser.sizes
+
+    def size(self, node):
+        return self.sizes[id(node)] if type(node) is tuple else 1
+
+    def edit(self, offset, deleted, inserted):
+        """
+        Apply the edit, update the tokens and the parse tree, and return the
+        new tree. On a LexError or SyntaxError nothing is changed.
+        """
+        text, tokens, first, old_resume, new_resume = relex(
+            self.text, self.tokens, offset, deleted, inserted)
+        shift = new_resume - old_resume
+        if first == old_resume == new_resume:
+            # only whitespace changed
+            self.text = text
+            self.tokens = tokens
+            return self.tree
+
+        # go down to the smallest subtree holding the changed tokens
+        sizes = self.sizes
+        path = []  # (node, start, index of the child on the path)
+        node, start = self.tree, 0
+        while True:
+            child_start = start
+            for i, child in enumerate(node[1]):
+                child_end = child_start + (
+                    sizes[id(child)] if type(child) is tuple else 1)
+                if child_end > first:
+                    break
+                child_start = child_end
+            else:
+                break
+            if (type(child) is not tuple or child_start > first
+                    or child_end < old_resume):
+                break
+            path.append((node, start, i))
+            node, start = child, child_start
+
+        # re-parse it, reusing its untouched parts; if it does not end where
+        # it used to, re-parse its parent instead
+        while True:
+            end = start + self.size(node)
+            cursor = OldTreeCursor(node, start, sizes)
+
+            def reuse(nonterminal, pos):
+                # the token after a subtree must be unchanged too, since it
+                # decides where a chain of MembersTag nodes ends
+                if pos < first:
+                    found = cursor.find(nonterminal, pos)
+                    if found is not None and found[1] < first:
+                        return found
+                elif pos >= new_resume:
+                    found = cursor.find(nonterminal, pos - shift)
+                    if found is not None:
+                        return found[0], found[1] + shift
+                return None
+
+            parser = ReusingParser(tokens, sizes, reuse)
+            try:
+                if not path:
+                    new = parser.parse()
+                    break
+                parser.skip_to(start)
+                new = getattr(parser, 'parse_' + node[0])()
+                if parser.pos == end + shift:
+                    break
+            except SyntaxError:
+                if not path:
+                    self.discard(parser)
+                    raise
+            self.discard(parser)
+            node, start, _ = path.pop()
+
+        # rebuild the path above it, and forget the sizes of the old nodes
+        self.forget([node], parser.reused)
+        delta = sizes[id(new)] - (end - start)
+        for parent, _, i in reversed(path):
+            children = parent[1]
+            new = (parent[0], children[:i] + (new,) + children[i + 1:])
+            sizes[id(new)] = sizes.pop(id(parent)) + delta
+
+        self.text = text
+        self.tokens = tokens
+        self.tree = new
+        return new
+
+    def discard(self, parser):
+        """
+        Remove the sizes of the nodes built by a parser whose result is not
+        used.
+        """
+        for node in parser.built:
+            self.sizes.pop(id(node), None)
+
+    def forget(self, nodes, keep):
+        """
+        Remove the sizes of the given nodes and of the nodes under them,
+        leaving out the subtrees whose roots have their ids in keep.
+        """
+        sizes = self.sizes
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if id(node) in keep:
+                continue
+            sizes.pop(id(node), None)
+            stack.extend(c for c in node[1] if type(c) is tuple)
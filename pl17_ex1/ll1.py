@@ -0,0 +1,126 @@
+"""
+This module contains a table-driven predictive (LL(1)) parser, that works
+for any LL(1) grammar in the format of grammar.py.
+
+The parsing table M[nonterminal, terminal] -> rule is built from the
+SELECT sets computed by grammar.calculate_select, and parsing is driven by
+an explicit stack instead of recursion, so deeply nested inputs do not hit
+Python's recursion limit.
+
+The parse tree has the same shape JsonParser builds:
+(label, (child1, child2, ..., childN))
+where the children are either trees themselves, or token values.
+"""
+
+from grammar import (calculate_first, calculate_follow, calculate_nullable,
+                     calculate_select, find_terminals_and_nonterminals,
+                     format_rule)
+from parser import SyntaxError
+from symbols import *
+
+
+class GrammarError(Exception):
+    pass
+
+
+def build_table(grammar):
+    """
+    Return the LL(1) parsing table of the grammar, as a dictionary mapping
+    pairs (nonterminal, terminal) to rules.
+
+    Raise a GrammarError if the grammar is not LL(1).
+    """
+    terminals, nonterminals = find_terminals_and_nonterminals(grammar)
+    nullable = calculate_nullable(terminals, nonterminals, grammar)
+    first = calculate_first(terminals, nonterminals, grammar, nullable)
+    follow = calculate_follow(terminals, nonterminals, grammar, nullable, first)
+    select = calculate_select(terminals, nonterminals, grammar, nullable, first, follow)
+    return table_from_select(grammar, select)
+
+
+def table_from_select(grammar, select):
+    """
+    Return the LL(1) parsing table given the SELECT sets of the grammar.
+    """
+    table = dict()
+    for rule in grammar:
+        for terminal in select[rule]:
+            other = table.setdefault((rule[0], terminal), rule)
+            if other != rule:
+                raise GrammarError(
+                    "Grammar is not LL(1), as the following rules have "
+                    "intersecting SELECT sets: {} and {}".format(
+                        format_rule(other), format_rule(rule)))
+    return table
+
+
+class LL1Parser(object):
+    """
+    A predictive parser for a grammar, given as a list of rules.
+    """
+    def __init__(self, grammar, table=None):
+        self.grammar = grammar
+        self.start = grammar[0][0]
+        self.nonterminals = set(head for head, body in grammar)
+        self.table = table if table is not None else build_table(grammar)
+
+    def parse(self, tokens):
+        """
+        Parse the tokens (an iterable of (terminal, value) pairs, as returned
+        by the lexer), and return the parse tree of the start symbol.
+        Raise a SyntaxError if the tokens are not in the language.
+        """
+        tokens = iter(tokens)
+        t, v = next(tokens, (EOF, EOF))
+        table = self.table
+        nonterminals = self.nonterminals
+
+        # each frame is [label, children, number of children]
+        root = [None, [], 1]
+        frames = [root]
+        stack = [self.start]  # symbols still to be matched, top is last
+        while stack:
+            symbol = stack.pop()
+            if symbol in nonterminals:
+                rule = table.get((symbol, t))
+                if rule is None:
+                    raise SyntaxError("Syntax error: no rule for token: {}".format(t))
+                body = rule[1]
+                frames.append([symbol, [], len(body)])
+                stack.extend(reversed(body))
+                if body:
+                    continue
+                child = None
+            elif symbol == t:
+                child = v
+                t, v = next(tokens, (EOF, EOF))
+            else:
+                raise SyntaxError("Syntax error: expected {}, found {}".format(
+                    symbol, t))
+
+            # add the child to its parent, and close every frame that is
+            # now complete
+            if child is not None:
+                frames[-1][1].append(child)
+            while len(frames) > 1 and len(frames[-1][1]) == frames[-1][2]:
+                label, children, _ = frames.pop()
+                frames[-1][1].append((label, tuple(children)))
+
+        if t != EOF:
+            raise SyntaxError("Syntax error: expected {}, found {}".format(EOF, t))
+        return root[1][0]
+
+
+if __name__ == '__main__':
+    from grammar import grammar_json_4c, grammar_recitation
+    from lexer import lex
+
+    tokens = lex(open('json_example.json').read())
+    print LL1Parser(grammar_json_4c).parse(tokens)
+    print
+
+    # if (x) y := z + w else y := w
+    tokens = [(IF, 'if'), (LP, '('), (ID, 'x'), (RP, ')'),
+              (ID, 'y'), (ASSIGN, ':='), (ID, 'z'), (PLUS, '+'), (ID, 'w'),
+              (ELSE, 'else'), (ID, 'y'), (ASSIGN, ':='), (ID, 'w')]
+    print LL1Parser(grammar_recitation).parse(tokens)
@@ -0,0 +1,59 @@
+"""
+This module contains observers for Parser.match.
+
+An observer is any callable taking (terminal, value), which is called
+after every token the parser matches. See Parser.set_observer.
+"""
+
+from collections import deque
+
+
+def format_match(terminal, value):
+    """
+    Return the trace line of a match. Values decoded from bytes (see
+    scanner.scan_bytes) are unicode, and are written back as UTF-8, so the
+    line is a str whatever the value.
+    """
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return "matched {:10} {}".format(terminal, value)
+
+
+class VerbosePrinter(object):
+    """
+    Print a line for every matched token (the parser's default trace).
+    """
+    def __call__(self, terminal, value):
+        print format_match(terminal, value)
+
+
+class CountingObserver(object):
+    """
+    Count the matched tokens, in total and per terminal.
+    """
+    def __init__(self):
+        self.total = 0
+        self.counts = dict()
+
+    def __call__(self, terminal, value):
+        self.total += 1
+        self.counts[terminal] = self.counts.get(terminal, 0) + 1
+
+
+class RingBufferObserver(object):
+    """
+    Keep the last n matches, for looking at what led to a SyntaxError.
+    """
+    def __init__(self, n=16):
+        self.matches = deque(maxlen=n)
+
+    def __call__(self, terminal, value):
+        self.matches.append((terminal, value))
+
+    def format(self):
+        """
+        Return the kept matches, one per line, in the format of
+        VerbosePrinter.
+        """
+        return '\n'.join(format_match(terminal, value)
+                         for terminal, value in self.matches)
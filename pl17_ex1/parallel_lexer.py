@@ -0,0 +1,108 @@
+"""
+This module contains a parallel lexer for huge inputs.
+
+The text is split into segments at safe points, each segment is lexed in a
+separate process, and the token lists are joined back in order.
+
+A split point is safe when lex would be between two tokens there: right
+after a structural character or a whitespace character that is outside of
+any "..." string. Since a STRING cannot contain a '"', a position is inside
+a string exactly when an odd number of '"' appear before it, which is
+counted in bulk with str.count.
+"""
+
+import multiprocessing
+
+from scanner import LexError, scan
+
+DEFAULT_SEGMENT_SIZE = 1 << 22
+
+# characters after which a new token always starts (outside of a string)
+_boundary_chars = frozenset('{}[],: \n\t')
+
+
+def find_split_points(text, segments):
+    """
+    Return a sorted list of safe split points that cut text into about the
+    given number of segments, including 0 and len(text).
+    """
+    n = len(text)
+    points = [0]
+    quotes = 0  # number of '"' in text[:counted]
+    counted = 0
+    for k in range(1, segments):
+        target = n * k // segments
+        if target <= points[-1]:
+            continue
+        quotes += text.count('"', counted, target)
+        counted = target
+        # walk back from target to the nearest safe point, keeping q the
+        # number of '"' in text[:pos]
+        pos = target
+        q = quotes
+        while pos > points[-1]:
+            c = text[pos - 1]
+            if c == '"':
+                q -= 1
+            elif q % 2 == 0 and c in _boundary_chars:
+                break
+            pos -= 1
+        if pos > points[-1]:
+            points.append(pos)
+    points.append(n)
+    return points
+
+
+def _lex_segment(segment):
+    """
+    Lex one segment, returning ('ok', tokens) or ('error', pos) with pos an
+    offset into the segment.
+    """
+    try:
+        return 'ok', scan(segment)
+    except LexError as e:
+        return 'error', e.pos
+
+
+def lex_parallel(text, processes=None, segment_size=DEFAULT_SEGMENT_SIZE):
+    """
+    Parse the string given by text, and return a list of the form:
+    [(terminal, value), (terminal, value), ...]
+
+    The result (and the LexError raised on a bad token, with its position,
+    line and column in the whole text) is the same as scan(text). Inputs of
+    at most segment_size characters are lexed serially.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    segments = min(processes, (len(text) + segment_size - 1) // segment_size)
+    if segments <= 1:
+        return scan(text)
+    points = find_split_points(text, segments)
+    jobs = [text[points[i]:points[i + 1]] for i in range(len(points) - 1)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_lex_segment, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    tokens = []
+    for start, (status, result) in zip(points, results):
+        if status == 'error':
+            # the first failing segment holds the error lex would report
+            raise LexError(start + result, text)
+        tokens.extend(result)
+    return tokens
+
+
+if __name__ == '__main__':
+    import time
+    from scanner import make_json
+    text = make_json(200000)
+    start = time.time()
+    expected = scan(text)
+    print "serial   {:.3f}s".format(time.time() - start)
+    start = time.time()
+    tokens = lex_parallel(text, segment_size=1 << 20)
+    print "parallel {:.3f}s".format(time.time() - start)
+    assert tokens == expected
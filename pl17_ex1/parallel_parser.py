@@ -0,0 +1,246 @@
+"""
+This module contains a parallel parser for documents with one huge
+top-level obj.
+
+The commas at nesting depth 1 split the members of the top-level obj into
+ranges of the text. Each worker of a pool of processes is sent a segment
+of the text holding a run of members, lexes and parses it itself into the
+arrays of a FlatTree (see flat_tree.py), and sends the arrays back as
+strings. Once the sizes of all segments are known, the workers also make
+the node numbers and token indices in the arrays absolute, so the parent
+only merges the label tables and concatenates the arrays into the
+FlatTree that FlatTreeParser builds for the whole text. Neither tokens nor
+trees of tuples cross process boundaries.
+
+Finding the ranges only looks at braces, commas and quotes, so it is
+speculative: if the input turns out not to have the expected shape, or
+any segment fails to lex or parse, the whole input is parsed serially,
+which raises the same LexError or SyntaxError a serial parse would.
+"""
+
+import multiprocessing
+import re
+from array import array
+
+from flat_tree import FlatTree, FlatTreeParser
+from parser import SyntaxError
+from scanner import LexError, scan
+from symbols import *
+
+# the characters that matter for the nesting depth, skipping STRINGs
+STRUCTURE = re.compile(r'"[^"]*"|[{},]')
+WHITESPACE_CHARS = ' \n\t'
+
+
+def split_members(text):
+    """
+    Return (start, commas, end), where text[start] is the '{' of the
+    top-level obj, text[end] its '}', and commas the offsets of the commas
+    between its members. Return None if the text does not look like an obj
+    with at least one member.
+    """
+    start = None
+    commas = []
+    depth = 0
+    for m in STRUCTURE.finditer(text):
+        i = m.start()
+        c = text[i]
+        if c == '{':
+            if start is None:
+                start = i
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                break
+            if depth < 0:
+                return None
+        elif c == ',' and depth == 1:
+            commas.append(i)
+    else:
+        return None
+    end = i
+    if (start is None or text[:start].strip(WHITESPACE_CHARS)
+            or text[end + 1:].strip(WHITESPACE_CHARS)
+            or not text[start + 1:end].strip(WHITESPACE_CHARS)):
+        return None
+    return start, commas, end
+
+
+def _parse_segment(job):
+    """
+    Parse a segment of members, of the form
+        keyvalue (COMMA keyvalue)*   if first is true
+        (COMMA keyvalue)+            otherwise
+    into FlatTree arrays, where -1 stands for the node enclosing the segment
+    (members, or the last MembersTag of the previous segment), and token
+    indices count from the start of the segment. The MembersTag nodes are
+    left open, to be closed once the whole obj is known.
+
+    Return (labels, codes, sizes, parents, leaves, token_starts, token_ends,
+    open MembersTag nodes, number of tokens), with the arrays as strings, or
+    None if the segment does not have this form (or has no tokens at all).
+    """
+    segment, first = job
+    try:
+        tokens = scan(segment)
+        if not tokens:
+            return None
+        parser = FlatTreeParser(tokens)
+        parser.set_observer(None)
+        if first:
+            parser.parse_keyvalue()
+        while parser.t == COMMA:
+            parser.open(MembersTag)
+            parser.leaf(COMMA)
+            parser.parse_keyvalue()
+        if parser.t != EOF or (not first and not parser.open_nodes):
+            return None
+    except (LexError, SyntaxError):
+        return None
+    tree = parser.tree
+    return (tree.labels, tree.codes.tostring(), tree.sizes.tostring(),
+            tree.parents.tostring(), tree.leaves.tostring(),
+            tree.token_starts.tostring(), tree.token_ends.tostring(),
+            array('i', parser.open_nodes).tostring(), parser.pos)
+
+
+def _relocate(job):
+    """
+    Turn the arrays of one result of _parse_segment into the corresponding
+    part of the arrays of the whole FlatTree: remap the label codes, make
+    node numbers and token indices absolute, and close the MembersTag nodes
+    left open. Return the arrays (as strings) codes, sizes, parents,
+    token_starts and token_ends.
+    """
+    result, remap, node_offset, chain_parent, token_offset, chain_end, token_end = job
+    codes, sizes, parents, token_starts, token_ends, open_nodes = (
+        array('i') for _ in range(6))
+    for part, string in ((codes, result[1]), (sizes, result[2]),
+                         (parents, result[3]), (token_starts, result[5]),
+                         (token_ends, result[6]), (open_nodes, result[7])):
+        part.fromstring(string)
+    codes = array('i', [remap[c] for c in codes])
+    parents = array('i', [p + node_offset if p >= 0 else chain_parent
+                          for p in parents])
+    token_starts = array('i', [t + token_offset for t in token_starts])
+    token_ends = array('i', [t + token_offset for t in token_ends])
+    for i in open_nodes:
+        sizes[i] = chain_end - (i + node_offset)
+        token_ends[i] = token_end
+    return (codes.tostring(), sizes.tostring(), parents.tostring(),
+            token_starts.tostring(), token_ends.tostring())
+
+
+def build_obj(results, map=map):
+    """
+    Stitch the results of _parse_segment, in order, into the FlatTree of
+    the whole obj. The per-node work is done by _relocate, through map
+    (which can be the map of a pool); this function only merges the label
+    tables and concatenates arrays.
+    """
+    tree = FlatTree()
+    root = tree.add(obj, -1, 0, 0)
+    tree.add('{', root, 1, 0)
+    e = tree.add(E, root, 0, 1)
+    members_node = tree.add(members, e, 0, 1)
+
+    jobs = []
+    node_offset = len(tree)
+    chain_parent = members_node
+    token_offset = 1
+    for result in results:
+        labels, codes, open_nodes, tokens = result[0], result[1], result[7], result[8]
+        remap = array('i')
+        for label in labels:
+            code = tree.label_codes.get(label)
+            if code is None:
+                code = tree.label_codes[label] = len(tree.labels)
+                tree.labels.append(label)
+            remap.append(code)
+        jobs.append([result, remap, node_offset, chain_parent, token_offset])
+        if open_nodes:
+            last = array('i')
+            last.fromstring(open_nodes[-last.itemsize:])
+            chain_parent = last[0] + node_offset
+        node_offset += len(codes) // array('i').itemsize
+        token_offset += tokens
+    # the MembersTag chain ends after the final (epsilon) MembersTag
+    for job in jobs:
+        job.extend((node_offset + 1, token_offset))
+
+    for codes, sizes, parents, token_starts, token_ends in map(_relocate, jobs):
+        tree.codes.fromstring(codes)
+        tree.sizes.fromstring(sizes)
+        tree.parents.fromstring(parents)
+        tree.token_starts.fromstring(token_starts)
+        tree.token_ends.fromstring(token_ends)
+    for result in results:
+        tree.leaves.fromstring(result[4])
+
+    tree.close(tree.add(MembersTag, chain_parent, 0, token_offset), token_offset)
+    tree.close(members_node, token_offset)
+    tree.close(e, token_offset)
+    tree.add('}', root, 1, token_offset)
+    tree.close(root, token_offset + 1)
+    return tree
+
+
+def parse_serial(text):
+    """
+    Parse the text with FlatTreeParser, without tracing.
+    """
+    parser = FlatTreeParser(scan(text))
+    parser.set_observer(None)
+    return parser.parse()
+
+
+def parse_parallel(text, processes=None, chunks_per_process=4, min_members=64):
+    """
+    Parse a JSON text, and return the same FlatTree parse_serial(text)
+    does (to_tree() gives the tree JsonParser builds). Objects with fewer
+    than min_members top-level members are parsed serially.
+    """
+    if not isinstance(text, basestring):
+        raise TypeError("parse_parallel takes the text of the document, "
+                        "not {}".format(type(text).__name__))
+    split = split_members(text)
+    if split is None or len(split[1]) + 1 < min_members:
+        return parse_serial(text)
+    start, commas, end = split
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    n = len(commas) + 1
+    chunks = max(1, min(n, processes * chunks_per_process))
+    size = (n + chunks - 1) // chunks
+    # member k is text[commas[k - 1] + 1:commas[k]]; each segment but the
+    # first starts at the comma before its first member
+    bounds = [start + 1] + commas[size - 1::size] + [end]
+    jobs = [(text[bounds[k]:bounds[k + 1]], k == 0)
+            for k in range(len(bounds) - 1)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_parse_segment, jobs, chunksize=1)
+        if any(result is None for result in results):
+            return parse_serial(text)
+        return build_obj(results, lambda f, jobs: pool.map(f, jobs, chunksize=1))
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    import time
+    from scanner import make_json
+    text = make_json(50000)
+    start = time.time()
+    expected = parse_serial(text)
+    print "serial   {:.3f}s".format(time.time() - start)
+    for processes in (1, multiprocessing.cpu_count()):
+        start = time.time()
+        tree = parse_parallel(text, processes)
+        print "parallel ({} processes) {:.3f}s".format(
+            processes, time.time() - start)
+    for name in ('codes', 'sizes', 'parents', 'leaves', 'token_starts', 'token_ends'):
+        assert getattr(tree, name) == getattr(expected, name)
+    assert tree.labels == expected.labels
@@ -2,7 +2,10 @@
 This file contains the JSON parser.
 """
 
+from hashcons import HashConsTable
+from observers import VerbosePrinter
 from symbols import *
+from token_stream import TokenStream
 
 
 class SyntaxError(Exception):
@@ -12,9 +15,9 @@ class SyntaxError(Exception):
 class Parser(object):
     """
     Class with basic functionality for parsers.
-
-    --- DO NOT MODIFY THIS CLASS ---
     """
+    observer = VerbosePrinter()
+
     def __init__(self, tokens):
         """
         Initialize the parser.
@@ -22,19 +25,24 @@ class Parser(object):
         [(t1, v1), (t2, v2), ...]
         where ti's are in terminals, and vi's are values attached to them.
         The list is in the format returned by the lexer.
-
-        --- DO NOT MODIFY THIS FUNCTION ---
+        tokens can also be any iterator of such pairs, in which case they
+        are pulled one at a time as parsing proceeds. With a TokenStream,
+        a value is only built when advancing past its token.
         """
         self.tokens = tokens
         self.pos = -1
+        if not hasattr(tokens, '__getitem__'):
+            self.tokens = iter(tokens)
+            self.lookahead_value = None
+            self.advance = self.advance_lazy
+        elif isinstance(tokens, TokenStream):
+            self.advance = self.advance_stream
         self.advance() # updates self.t, which keeps the current terminal
 
     def advance(self):
         """
         Return the value attached to current token, and advance by one.
         Return EOF once all tokens are exhausted.
-
-        --- DO NOT MODIFY THIS FUNCTION ---
         """
         if self.pos < len(self.tokens):
             value = self.tokens[self.pos][1]
@@ -47,22 +55,110 @@ class Parser(object):
             self.t = EOF
         return value
 
+    def advance_lazy(self):
+        """
+        Like advance, when self.tokens is an iterator. The current token is
+        kept in self.t and self.lookahead_value, and the next one is only
+        pulled from the iterator when advancing past it.
+        """
+        value = self.lookahead_value
+        self.pos += 1
+        token = next(self.tokens, None)
+        if token is None:
+            self.t = self.lookahead_value = EOF
+        else:
+            self.t, self.lookahead_value = token
+        return value
+
+    def advance_stream(self):
+        """
+        Like advance, when self.tokens is a TokenStream. Only the value of
+        the token advanced past is built; the next terminal is read without
+        building its value.
+        """
+        tokens = self.tokens
+        n = len(tokens)
+        if self.pos < 0:
+            value = None
+        elif self.pos < n:
+            value = tokens.value(self.pos)
+        else:
+            value = EOF
+        self.pos += 1
+        if self.pos < n:
+            self.t = tokens.terminal(self.pos)
+        else:
+            self.t = EOF
+        return value
+
     def match(self, terminal):
         """
         Match the next token against the given terminal. Raise a
         SyntaxError if they do not match.
-        If they do, return the value attached to the current token.
-
-        --- DO NOT MODIFY THIS FUNCTION ---
+        If they do, return the value attached to the current token, after
+        passing the terminal and the value to the observer.
         """
         if self.t == terminal:
             value = self.advance()
-            print "matched {:10} {}".format(terminal, value)
+            self.observer(terminal, value)
             return value
         else:
             raise SyntaxError("Syntax error: expected {}, found {}".format(
                 terminal, self.t))
 
+    def match_untraced(self, terminal):
+        """
+        Like match, without calling the observer. Used as match when no
+        observer is attached.
+        """
+        if self.t == terminal:
+            return self.advance()
+        else:
+            raise SyntaxError("Syntax error: expected {}, found {}".format(
+                terminal, self.t))
+
+    def set_observer(self, observer):
+        """
+        Attach an observer, called with (terminal, value) on every match
+        (see observers.py). The default observer prints every match.
+        With None, match is replaced by match_untraced, so tracing costs
+        nothing.
+        """
+        self.observer = observer
+        if observer is None:
+            self.match = self.match_untraced
+        else:
+            self.__dict__.pop('match', None)
+
+
+# The decisions of JsonParser as a state machine over single tokens, used by
+# JsonParser.validate and JsonEventParser.events. A state is the symbol
+# expected next, and the epsilon rules are folded into the entry of the
+# token that follows them. Each entry is
+# (state, terminal) -> (event, next state, change of the nesting depth),
+# where event is the event of JsonEventParser the token fires (or None).
+# The input ends when the depth is back to 0.
+TRANSITIONS = {
+    # obj -> LB E RB
+    (obj, LB): ('start_obj', E, 1),
+    # E -> members, members -> keyvalue MembersTag,
+    # keyvalue -> STRING COLON value
+    (E, STRING): ('key', COLON, 0),
+    # E -> epsilon, and the RB of the obj
+    (E, RB): ('end_obj', MembersTag, -1),
+    (keyvalue, STRING): ('key', COLON, 0),
+    (COLON, COLON): (None, value, 0),
+    # value -> STRING | INT | obj
+    (value, STRING): ('scalar', MembersTag, 0),
+    (value, INT): ('scalar', MembersTag, 0),
+    (value, LB): ('start_obj', E, 1),
+    # MembersTag -> COMMA keyvalue MembersTag
+    (MembersTag, COMMA): (None, keyvalue, 0),
+    # MembersTag -> epsilon, and the RB of the obj; the enclosing obj (if
+    # any) continues with the MembersTag after the keyvalue holding it
+    (MembersTag, RB): ('end_obj', MembersTag, -1),
+}
+
 
 class JsonParser(Parser):
     """
@@ -70,6 +166,28 @@ class JsonParser(Parser):
 
     --- COMPLETE THIS CLASS IN QUESTION 6 ---
     """
+    def __init__(self, tokens, hash_cons=None, flat_members=False):
+        """
+        Initialize the parser. If hash_cons is given (True, or a
+        HashConsTable to share with other parsers), structurally identical
+        subtrees of the result are shared, making it a DAG.
+        If flat_members is true, the members of an obj are kept in a single
+        MembersTag node (see parse_MembersTag).
+        """
+        if hash_cons is True:
+            hash_cons = HashConsTable()
+        self.hash_cons = hash_cons
+        self.flat_members = flat_members
+        Parser.__init__(self, tokens)
+
+    def node(self, label, children):
+        """
+        Return the parse tree node (label, children).
+        """
+        if self.hash_cons is None:
+            return (label, children)
+        return self.hash_cons.node(label, children)
+
     def parse(self):
         """
         Parse the input by parsing the start symbol (obj) and then matching EOF.
@@ -80,17 +198,63 @@ class JsonParser(Parser):
         self.match(EOF)
         return result
 
-    def parse_keyvalue(self):
+    def terminals(self):
+        """
+        Generate the terminals of the tokens from the current one on,
+        followed by EOF, without reading their values.
+        """
+        yield self.t
+        tokens = self.tokens
+        if isinstance(tokens, TokenStream):
+            names = tokens.terminals
+            for i in xrange(self.pos + 1, len(tokens)):
+                yield names[tokens.kinds[i]]
+        elif hasattr(tokens, '__getitem__'):
+            for i in xrange(self.pos + 1, len(tokens)):
+                yield tokens[i][0]
+        else:
+            for token in tokens:
+                yield token[0]
+        while True:
+            yield EOF
+
+    def validate(self):
         """
-        An example parse_<nonterminal> function.
+        Check whether the input is valid, making the same decisions parse
+        does (through TRANSITIONS), but without building a tree or reading
+        any token value.
+        Return -1 if it is valid, or the index of the token at which parse
+        would raise a SyntaxError.
+        The parser cannot be used after this.
+        """
+        transitions = TRANSITIONS
+        pos = self.pos
+        state = obj
+        depth = 0
+        terminals = self.terminals()
+        for t in terminals:
+            entry = transitions.get((state, t))
+            if entry is None:
+                return pos
+            _, state, change = entry
+            pos += 1
+            depth += change
+            if not depth:
+                break
+        if next(terminals) != EOF:
+            return pos
+        return -1
 
-        --- DO NOT MODIFY THIS FUNCTION ---
+    def parse_keyvalue(self):
+        """
+        Parses the keyvalue non-terminal according to its production rule and its select set:
+        keyvalue -> STRING COLON value  (select set: {STRING})
         """
         if self.t in [STRING]:
             c1 = self.match(STRING)
             c2 = self.match(COLON)
             c3 = self.parse_value()
-            return (keyvalue, (c1, c2, c3))
+            return self.node(keyvalue, (c1, c2, c3))
         else:
             raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
 
@@ -106,7 +270,7 @@ class JsonParser(Parser):
             c1 = self.match(LB)
             c2 = self.parse_E()
             c3 = self.match(RB)
-            return (obj, (c1, c2, c3))
+            return self.node(obj, (c1, c2, c3))
         else:
             raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
         
@@ -123,10 +287,10 @@ class JsonParser(Parser):
         if self.t == STRING:
             # Applying the rule E -> members
             c1 = self.parse_members()
-            return (E, (c1,))
+            return self.node(E, (c1,))
         elif self.t == RB:
             # Applying the rule E -> epsilon
-            return (E, ())
+            return self.node(E, ())
         else:
             raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
         
@@ -139,7 +303,7 @@ class JsonParser(Parser):
             # Applying the rule members -> keyvalue MembersTag
             c1 = self.parse_keyvalue()
             c2 = self.parse_MembersTag()
-            return (members, (c1, c2))
+            return self.node(members, (c1, c2))
         else:
             raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
 
@@ -148,19 +312,28 @@ class JsonParser(Parser):
         Parses the MembersTag non-terminal according to its production rules and their select sets:
         MembersTag -> COMMA keyvalue MembersTag (select set: {COMMA})
         MembersTag -> epsilon                   (select set: {RB})
+
+        The rules are applied in a loop rather than by recursion, so objects
+        with many members do not hit the recursion limit, and the chain of
+        MembersTag nodes is then built from the last one backwards. With
+        flat_members, a single MembersTag node holding all the COMMA and
+        keyvalue children is built instead.
         """
-        if self.t == COMMA:
+        children = []
+        while self.t == COMMA:
             # Applying the rule MembersTag -> COMMA keyvalue MembersTag
-            c1 = self.match(COMMA)
-            c2 = self.parse_keyvalue()
-            c3 = self.parse_MembersTag()
-            return (MembersTag, (c1, c2, c3))
-        elif self.t == RB:
-            # Applying the rule MembersTag -> epsilon
-            return (MembersTag, ())
-        else:
+            children.append(self.match(COMMA))
+            children.append(self.parse_keyvalue())
+        if self.t != RB:
             raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
-        
+        # Applying the rule MembersTag -> epsilon
+        if self.flat_members:
+            return self.node(MembersTag, tuple(children))
+        result = self.node(MembersTag, ())
+        for i in range(len(children) - 2, -1, -2):
+            result = self.node(MembersTag, (children[i], children[i + 1], result))
+        return result
+
     def parse_value(self):
         """
         Parses the value non-terminal according to its production rules and their select sets:
@@ -171,18 +344,162 @@ class JsonParser(Parser):
         if self.t == STRING:
             # Applying the rule value -> STRING
             c1 = self.match(STRING)
-            return (value, (c1,))
+            return self.node(value, (c1,))
         elif self.t == INT:
             # Applying the rule value -> INT
             c1 = self.match(INT)
-            return (value, (c1,))
+            return self.node(value, (c1,))
         elif self.t == LB:
             # Applying the rule value -> obj
             c1 = self.parse_obj()
-            return (value, (c1,))
+            return self.node(value, (c1,))
         else:
             raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
 
+
+class JsonEventParser(JsonParser):
+    """
+    A JSON parser that reports events as the rules fire, instead of building
+    a parse tree. It makes the same decisions (and raises the same
+    SyntaxErrors) as JsonParser, but keeps no more state than the current
+    nesting depth.
+
+    The events are pairs (event, value):
+    ('start_obj', None)  - on the LB of an obj
+    ('key', value)       - on the STRING of a keyvalue
+    ('scalar', value)    - on a value that is a STRING or an INT
+    ('end_obj', None)    - on the RB of an obj
+    """
+    def events(self):
+        """
+        Generate the events of the input (following TRANSITIONS), and then
+        match EOF.
+        """
+        transitions = TRANSITIONS
+        state = obj
+        depth = 0
+        while True:
+            entry = transitions.get((state, self.t))
+            if entry is None:
+                if state == COLON:
+                    self.match(COLON)  # raises the SyntaxError parse does
+                raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
+            event, state, change = entry
+            value = self.match(self.t)
+            if event == 'key' or event == 'scalar':
+                yield (event, value)
+            elif event is not None:
+                yield (event, None)
+            depth += change
+            if not depth:
+                break
+        self.match(EOF)
+
+    def parse(self, handler=None):
+        """
+        Parse the input, calling handler(event, value) on every event.
+        """
+        for event, value in self.events():
+            if handler is not None:
+                handler(event, value)
+
+
+class JsonValueParser(JsonParser):
+    """
+    A JSON parser that builds Python values directly, instead of a parse
+    tree: a dict for every obj, an int for every INT, and a str (without
+    the quotes) for every STRING. It makes the same decisions (and raises
+    the same SyntaxErrors) as JsonParser.
+    """
+    def parse_keyvalue(self):
+        """
+        keyvalue -> STRING COLON value
+        Return the pair (key, value).
+        """
+        if self.t == STRING:
+            key = self.match(STRING)[1:-1]
+            self.match(COLON)
+            return key, self.parse_value()
+        else:
+            raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
+
+    def parse_obj(self):
+        """
+        obj -> LB E RB
+        """
+        if self.t == LB:
+            self.match(LB)
+            result = self.parse_E()
+            self.match(RB)
+            return result
+        else:
+            raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
+
+    def parse_E(self):
+        """
+        E -> members | epsilon
+        """
+        if self.t == STRING:
+            return self.parse_members()
+        elif self.t == RB:
+            return dict()
+        else:
+            raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
+
+    def parse_members(self):
+        """
+        members -> keyvalue MembersTag
+        """
+        if self.t == STRING:
+            result = dict()
+            key, value = self.parse_keyvalue()
+            result[key] = value
+            self.parse_MembersTag(result)
+            return result
+        else:
+            raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
+
+    def parse_MembersTag(self, result):
+        """
+        MembersTag -> COMMA keyvalue MembersTag | epsilon
+        The key-value pairs are added to result, in a loop rather than by
+        recursion.
+        """
+        while self.t == COMMA:
+            self.match(COMMA)
+            key, value = self.parse_keyvalue()
+            result[key] = value
+        if self.t != RB:
+            raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
+
+    def parse_value(self):
+        """
+        value -> STRING | INT | obj
+        """
+        if self.t == STRING:
+            return self.match(STRING)[1:-1]
+        elif self.t == INT:
+            return int(self.match(INT))
+        elif self.t == LB:
+            return self.parse_obj()
+        else:
+            raise SyntaxError("Syntax error: no rule for token: {}".format(self.t))
+
+
+def parse_stream(tokens):
+    """
+    Parse a TokenStream with JsonParser and return the parse tree.
+    A SyntaxError is raised with the line and column of the offending
+    token added to its message.
+    """
+    parser = JsonParser(tokens)
+    try:
+        return parser.parse()
+    except SyntaxError as e:
+        line, column = tokens.line_column(parser.pos)
+        raise SyntaxError("{} (line {}, column {})".format(e, line, column))
+
+
 def create_tree(input_file_name, output_file_name):
     from lexer import lex
     from tree_to_dot import tree_to_dot, view
@@ -0,0 +1,31 @@
+"""
+This module contains LineIndex, which translates offsets into a text to
+line and column numbers.
+"""
+
+from array import array
+from bisect import bisect_right
+
+from token_stream import OFFSET_TYPECODE
+
+
+class LineIndex(object):
+    """
+    The offsets at which the lines of a text start, found in one pass over
+    the text. Each query is then a binary search.
+    """
+    def __init__(self, text):
+        self.line_starts = array(OFFSET_TYPECODE, [0])
+        find = text.find
+        pos = find('\n')
+        while pos >= 0:
+            self.line_starts.append(pos + 1)
+            pos = find('\n', pos + 1)
+
+    def line_column(self, pos):
+        """
+        Return the pair (line, column) of the given offset, both counting
+        from 1.
+        """
+        line = bisect_right(self.line_starts, pos)
+        return line, pos - self.line_starts[line - 1] + 1
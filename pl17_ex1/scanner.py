@@ -0,0 +1,180 @@
+"""
+This module contains a single-pass scanner that is equivalent to lexer.lex.
+
+All the patterns in lexer.token_regex (plus whitespace) are compiled into
+one alternation with a named group per terminal. The compiled pattern is
+matched at an offset into the text, so the input is never sliced, and
+every token costs a single call into the regex engine.
+"""
+
+import re
+import time
+
+from lexer import lex, token_regex
+from positions import LineIndex
+from token_stream import TokenStream
+
+WHITESPACE = '_WS'
+whitespace_regex = '[ \\n\\t]+'
+
+
+class LexError(Exception):
+    """
+    Raised on a bad token, with the message lex uses followed by the line
+    and column of the bad token.
+    pos is the offset of the bad token in text.
+    """
+    def __init__(self, pos, text):
+        self.pos = pos
+        self.line, self.column = LineIndex(text).line_column(pos)
+        Exception.__init__(self, "Bad token at: {} (line {}, column {})".format(
+            pos, self.line, self.column))
+
+    @classmethod
+    def at(cls, pos, line, column):
+        """
+        Return a LexError for a bad token whose line and column are already
+        known (for example, when the whole text is not at hand).
+        """
+        error = Exception.__new__(cls)
+        Exception.__init__(error, "Bad token at: {} (line {}, column {})".format(
+            pos, line, column))
+        error.pos, error.line, error.column = pos, line, column
+        return error
+
+    def __reduce__(self):
+        # pickle (e.g. to send from a worker process) without the text
+        return _rebuild_lex_error, (self.pos, self.line, self.column)
+
+
+def _rebuild_lex_error(pos, line, column):
+    return LexError.at(pos, line, column)
+
+
+# compiled scanners, keyed by the token specification they were built from
+_scanner_cache = dict()
+
+
+def compile_scanner(token_regex, binary=False):
+    """
+    Compile a dictionary mapping terminals to regular expressions into one
+    pattern of the form:
+    (?P<_WS>whitespace)|(?P<t1>r1)|(?P<t2>r2)|...
+
+    The alternatives are tried in the same order lex tries them (whitespace
+    first, then token_regex.items()), so the first one to match wins just
+    like in lex.
+
+    If binary is true, the pattern is compiled for matching bytes.
+    """
+    key = (tuple(token_regex.items()), binary)
+    pattern = _scanner_cache.get(key)
+    if pattern is None:
+        alternatives = ['(?P<{}>{})'.format(WHITESPACE, whitespace_regex)]
+        for token, regex in key[0]:
+            alternatives.append('(?P<{}>{})'.format(token, regex))
+        pattern = '|'.join(alternatives)
+        if binary:
+            pattern = pattern.encode('ascii')
+        pattern = re.compile(pattern)
+        _scanner_cache[key] = pattern
+    return pattern
+
+
+def scan(text, pos=0, endpos=None):
+    """
+    Lex text[pos:endpos] (without slicing it), and return a list of the form:
+    [(terminal, value), (terminal, value), ...]
+
+    This is the same list lex(text) returns. A bad token raises a LexError,
+    whose message is the "Bad token at: {pos}" of lex (with pos an offset
+    into the whole text) followed by " (line {line}, column {column})".
+    """
+    return list(iter_scan(text, pos, endpos))
+
+
+def iter_scan(text, pos=0, endpos=None):
+    """
+    Like scan, but generate the (terminal, value) pairs one at a time, so a
+    parser can consume them while lexing is still going on. scan is built on
+    this generator, so the two always agree.
+    """
+    if endpos is None:
+        endpos = len(text)
+    match = compile_scanner(token_regex).match
+    while pos < endpos:
+        m = match(text, pos, endpos)
+        if m is None:
+            raise LexError(pos, text)
+        token = m.lastgroup
+        if token != WHITESPACE:
+            yield (token, m.group())
+        pos = m.end()
+
+
+def scan_stream(text, pos=0, endpos=None):
+    """
+    Like scan, but return a TokenStream over text instead of a list.
+    """
+    return _scan_stream(text, pos, endpos, compile_scanner(token_regex),
+                        TokenStream(text))
+
+
+def scan_bytes(data, encoding='utf-8', pos=0, endpos=None):
+    """
+    Like scan_stream, but lex raw bytes (a str, bytearray or mmap) directly,
+    without decoding them first. Only the STRING values that are read from
+    the returned TokenStream are decoded, with the given encoding.
+    """
+    return _scan_stream(data, pos, endpos, compile_scanner(token_regex, True),
+                        TokenStream(data, encoding))
+
+
+def _scan_stream(text, pos, endpos, pattern, tokens):
+    if endpos is None:
+        endpos = len(text)
+    match = pattern.match
+    append = tokens.append
+    while pos < endpos:
+        m = match(text, pos, endpos)
+        if m is None:
+            raise LexError(pos, text)
+        token = m.lastgroup
+        end = m.end()
+        if token != WHITESPACE:
+            append(token, pos, end)
+        pos = end
+    return tokens
+
+
+def make_json(n):
+    """
+    Return a JSON document with n key-value pairs, for benchmarking.
+    """
+    members = []
+    for i in range(n):
+        members.append('    "key{0}": {{"name": "value {0}", "id": {0}}}'.format(i))
+    return '{\n' + ',\n'.join(members) + '\n}\n'
+
+
+def benchmark(sizes=(500, 1000, 2000, 4000, 8000)):
+    """
+    Compare lex and scan on inputs of growing size, and print the timings.
+    """
+    print "{:>8} {:>10} {:>10} {:>10} {:>8}".format(
+        'members', 'bytes', 'lex (s)', 'scan (s)', 'speedup')
+    for n in sizes:
+        text = make_json(n)
+        start = time.time()
+        expected = lex(text)
+        lex_time = time.time() - start
+        start = time.time()
+        tokens = scan(text)
+        scan_time = time.time() - start
+        assert tokens == expected
+        print "{:>8} {:>10} {:>10.4f} {:>10.4f} {:>7.1f}x".format(
+            n, len(text), lex_time, scan_time, lex_time / max(scan_time, 1e-9))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,89 @@
+"""
+This module contains a streaming lexer, which reads its input in chunks
+from a file object (or an mmap) and yields tokens as it goes, instead of
+reading the whole text up front.
+"""
+
+import mmap
+
+from lexer import token_regex
+from scanner import LexError, WHITESPACE, compile_scanner
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def lex_stream(f, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Lex the text read from f, which is anything with a read(n) method (an
+    open file, an mmap, a StringIO...), and yield pairs of the form:
+    (terminal, value)
+
+    The tokens are the same ones lex returns for the whole text. A token
+    that crosses a chunk boundary (for example a STRING split between two
+    reads) is only yielded once it is complete, so memory is bounded by the
+    chunk size plus the longest token. A bad token is reported as soon as it
+    is read (except for an unterminated STRING, which is only known to be
+    bad at the end of the input), as a LexError with its offset, line and
+    column in the whole input.
+    """
+    match = compile_scanner(token_regex).match
+    buf = ''
+    offset = 0  # position of buf[0] in the whole input
+    line = 1  # line of buf[0]
+    line_start = 0  # position of the start of that line in the whole input
+    want = chunk_size
+    eof = False
+    while not eof:
+        chunk = f.read(want)
+        eof = not chunk
+        buf += chunk
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            m = match(buf, pos)
+            if m is None and (eof or buf[pos] != '"'):
+                # only an unterminated STRING can become a token with more
+                # input, anything else is an error right away
+                lines = buf.count('\n', 0, pos)
+                if lines:
+                    line_start = offset + buf.rindex('\n', 0, pos) + 1
+                raise LexError.at(offset + pos, line + lines,
+                                  offset + pos - line_start + 1)
+            if m is None or (m.end() == end and not eof):
+                # the token may continue in the next chunk
+                break
+            token = m.lastgroup
+            if token != WHITESPACE:
+                yield (token, m.group())
+            pos = m.end()
+        lines = buf.count('\n', 0, pos)
+        if lines:
+            line += lines
+            line_start = offset + buf.rindex('\n', 0, pos) + 1
+        buf = buf[pos:]
+        offset += pos
+        # a long pending token is read in growing steps, so it is not
+        # re-matched once per chunk
+        want = max(chunk_size, len(buf))
+
+
+def lex_file(file_name, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the tokens of the given file, reading it through an mmap.
+    """
+    with open(file_name, 'rb') as f:
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return
+        try:
+            for token in lex_stream(m, chunk_size):
+                yield token
+        finally:
+            m.close()
+
+
+if __name__ == '__main__':
+    for t in lex_file('json_example.json', chunk_size=16):
+        print "  ", t
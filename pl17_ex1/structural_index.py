@@ -0,0 +1,145 @@
+"""
+This module contains a vectorized first pass over JSON input, in the style
+of simdjson's stage 1, written with NumPy.
+
+Every byte of the input is classified through a lookup table, the bytes
+inside strings are found from the parity of the number of quotes before
+them, and the offsets of the structural characters and of the INT and
+STRING tokens are extracted with bulk array operations. A TokenStream
+that JsonParser can consume is then built from the index, with no Python
+work per character.
+
+Since a STRING cannot contain a '"', a byte is inside a string exactly when
+an odd number of '"' appear up to it.
+"""
+
+import numpy as np
+
+from scanner import LexError
+from symbols import *
+from token_stream import OFFSET_TYPECODE, TokenStream
+
+# byte classes
+OTHER_CLASS = 0
+WHITESPACE_CLASS = 1
+STRUCTURAL_CLASS = 2
+DIGIT_CLASS = 3
+QUOTE_CLASS = 4
+
+byte_class = np.zeros(256, dtype=np.uint8)
+for c in ' \n\t':
+    byte_class[ord(c)] = WHITESPACE_CLASS
+for c in '{}[],:':
+    byte_class[ord(c)] = STRUCTURAL_CLASS
+for c in '0123456789':
+    byte_class[ord(c)] = DIGIT_CLASS
+byte_class[ord('"')] = QUOTE_CLASS
+
+# terminal codes used in the token streams built from the index
+index_terminals = [LB, RB, LS, RS, COMMA, COLON, INT, STRING]
+_structural_terminals = {'{': LB, '}': RB, '[': LS, ']': RS, ',': COMMA, ':': COLON}
+
+# maps a byte to the code of the terminal of a token starting with it
+token_code = np.zeros(256, dtype=np.uint8)
+for c, terminal in _structural_terminals.items():
+    token_code[ord(c)] = index_terminals.index(terminal)
+for c in '0123456789':
+    token_code[ord(c)] = index_terminals.index(INT)
+token_code[ord('"')] = index_terminals.index(STRING)
+
+
+class StructuralIndex(object):
+    """
+    The result of the first pass over a JSON input:
+
+    structurals    - offsets of the structural characters { } [ ] , :
+    string_starts  - offsets of the opening quotes of STRING tokens
+    string_ends    - offsets just past the matching closing quotes
+    int_starts     - offsets of the first digits of INT tokens
+    int_ends       - offsets just past their last digits
+
+    All are sorted NumPy arrays of int64.
+    """
+    def __init__(self, data):
+        self.data = data
+        b = np.frombuffer(data, dtype=np.uint8)
+        n = len(b)
+        classes = byte_class[b]
+        is_quote = classes == QUOTE_CLASS
+        in_string = (np.cumsum(is_quote, dtype=np.int64) & 1).astype(bool)
+        outside = ~in_string
+
+        quotes = np.flatnonzero(is_quote)
+        self.string_starts = quotes[0::2]
+        self.string_ends = quotes[1::2] + 1
+
+        self.structurals = np.flatnonzero((classes == STRUCTURAL_CLASS) & outside)
+
+        is_digit = (classes == DIGIT_CLASS) & outside
+        previous_digit = np.zeros(n, dtype=bool)
+        previous_digit[1:] = is_digit[:-1]
+        next_digit = np.zeros(n, dtype=bool)
+        next_digit[:-1] = is_digit[1:]
+        self.int_starts = np.flatnonzero(is_digit & ~previous_digit)
+        self.int_ends = np.flatnonzero(is_digit & ~next_digit) + 1
+
+        # the first bad token, at the same offset lex would report it: a
+        # byte outside strings that starts no token, or an opening quote
+        # with no closing one
+        bad = np.flatnonzero((classes == OTHER_CLASS) & outside)
+        self.error = int(bad[0]) if len(bad) else None
+        if len(self.string_starts) > len(self.string_ends):
+            unterminated = int(self.string_starts[-1])
+            if self.error is None or unterminated < self.error:
+                self.error = unterminated
+
+    def token_starts(self):
+        """
+        Return the sorted offsets at which tokens start.
+        """
+        starts = np.concatenate(
+            (self.structurals, self.string_starts, self.int_starts))
+        starts.sort()
+        return starts
+
+    def to_token_stream(self, encoding=None):
+        """
+        Return a TokenStream with the same tokens lex would find in the
+        input. Raise a LexError on a bad token.
+        """
+        if self.error is not None:
+            raise LexError(self.error, self.data)
+        b = np.frombuffer(self.data, dtype=np.uint8)
+        starts = self.token_starts()
+        ends = starts + 1
+        string_positions = np.searchsorted(starts, self.string_starts)
+        ends[string_positions] = self.string_ends
+        int_positions = np.searchsorted(starts, self.int_starts)
+        ends[int_positions] = self.int_ends
+
+        tokens = TokenStream(self.data, encoding)
+        for terminal in index_terminals:
+            tokens.code(terminal)
+        offset_type = np.dtype(OFFSET_TYPECODE)
+        tokens.kinds.fromstring(token_code[b[starts]].tostring())
+        tokens.starts.fromstring(starts.astype(offset_type).tostring())
+        tokens.ends.fromstring(ends.astype(offset_type).tostring())
+        return tokens
+
+
+def lex_vectorized(data, encoding=None):
+    """
+    Lex the bytes given by data (a str, bytearray or mmap) with the
+    vectorized first pass, and return a TokenStream.
+    """
+    return StructuralIndex(data).to_token_stream(encoding)
+
+
+if __name__ == '__main__':
+    import time
+    from scanner import make_json, scan_stream
+    text = make_json(100000)
+    for f in (scan_stream, lex_vectorized):
+        start = time.time()
+        f(text)
+        print "{:15} {:.4f}s".format(f.__name__, time.time() - start)
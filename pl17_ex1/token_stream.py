@@ -0,0 +1,121 @@
+"""
+This module contains TokenStream, a compact replacement for the list of
+(terminal, value) pairs returned by the lexer.
+
+Instead of a tuple and a string per token, a TokenStream keeps the kind of
+each token as one byte, and its start and end offsets into the source text
+as 8 byte integers. Values are only sliced out of the source when they are
+asked for, and view() gives them without copying at all.
+"""
+
+from array import array
+
+from symbols import *
+
+try:
+    array('q')
+    OFFSET_TYPECODE = 'q'
+except ValueError:
+    # no 'q' typecode before Python 3.3; 'l' is 8 bytes on LP64 platforms
+    OFFSET_TYPECODE = 'l'
+
+
+class TokenStream(object):
+    """
+    A sequence of tokens over a source text.
+
+    It supports len() and indexing, where tokens[i] is the pair
+    (terminal, value), so it can be given to Parser instead of a list.
+
+    If encoding is given, source holds raw bytes (a str, bytearray or mmap),
+    and the values of the terminals in decoded_terminals are decoded with
+    encoding when they are asked for. Other values are returned as bytes.
+    """
+    def __init__(self, source, encoding=None, decoded_terminals=(STRING,)):
+        self.source = source
+        self.encoding = encoding
+        self.decoded_terminals = frozenset(decoded_terminals)
+        self.terminals = []  # code -> terminal
+        self.codes = dict()  # terminal -> code
+        self.kinds = array('B')
+        self.starts = array(OFFSET_TYPECODE)
+        self.ends = array(OFFSET_TYPECODE)
+        self._view = None
+        self._lines = None
+
+    def code(self, terminal):
+        """
+        Return the code used for the given terminal in self.kinds.
+        """
+        code = self.codes.get(terminal)
+        if code is None:
+            code = len(self.terminals)
+            if code > 255:
+                raise ValueError("Too many terminals for a TokenStream")
+            self.terminals.append(terminal)
+            self.codes[terminal] = code
+        return code
+
+    def append(self, terminal, start, end):
+        """
+        Add a token of the given terminal, spanning source[start:end].
+        """
+        self.kinds.append(self.code(terminal))
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        return self.terminals[self.kinds[i]], self.value(i)
+
+    def __iter__(self):
+        for i in xrange(len(self.kinds)):
+            yield self[i]
+
+    def terminal(self, i):
+        """
+        Return the terminal of the i'th token, without building its value.
+        """
+        return self.terminals[self.kinds[i]]
+
+    def value(self, i):
+        """
+        Return the value of the i'th token.
+        """
+        value = self.source[self.starts[i]:self.ends[i]]
+        if self.encoding is None:
+            return value
+        value = bytes(value)
+        if self.terminals[self.kinds[i]] in self.decoded_terminals:
+            return value.decode(self.encoding)
+        return value
+
+    def span(self, i):
+        """
+        Return the pair (start, end) of offsets of the i'th token.
+        """
+        return self.starts[i], self.ends[i]
+
+    def view(self, i):
+        """
+        Return a memoryview of the i'th token's value in the source, which
+        must support the buffer protocol (str, bytearray, mmap...).
+        """
+        if self._view is None:
+            self._view = memoryview(self.source)
+        return self._view[self.starts[i]:self.ends[i]]
+
+    def line_column(self, i):
+        """
+        Return the pair (line, column) where the i'th token starts. For i
+        past the last token, return the position of the end of the source.
+        The line index is built on the first call.
+        """
+        if self._lines is None:
+            from positions import LineIndex
+            self._lines = LineIndex(self.source)
+        if i < len(self.kinds):
+            return self._lines.line_column(self.starts[i])
+        return self._lines.line_column(len(self.source))
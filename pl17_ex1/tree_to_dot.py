@@ -1,11 +1,13 @@
 """
-File with functions to draw a tree represented by tuples using DOT.
+File with functions to draw a tree represented by tuples (or a FlatTree)
+using DOT.
 
---- DO NOT MODIFY THIS FILE ---
+The conversion is iterative, so it handles trees of any depth, such as the
+chain of MembersTag nodes of an obj with many members.
 """
 
 
-def tree_to_dot(tree):
+def tree_to_dot(tree, shared=False):
     """
     Convert a parse tree to Graphviz dot format and return it.
 
@@ -16,20 +18,54 @@ def tree_to_dot(tree):
     where the the children are either trees themselves, or values that
     represent leafs.
 
+    Tree can also be a FlatTree (see flat_tree.py).
+
+    If shared is true, a subtree object that appears several times in the
+    tree, as in the DAGs built with hash consing (see hashcons.py), is drawn
+    once, with an edge from each of its parents. Otherwise it is drawn once
+    per appearance. Leaves are always drawn once per appearance (equal
+    strings, such as one-character tokens, can be the same object without
+    being shared).
     """
     nodes = [] # list of (number, label)
     edges = [] # list of (number, number)
+    numbers = dict() # id of a shared object -> its number
 
-    def convert(t):
+    def enter(t):
+        # draw t, and return its number and its children (None if it was
+        # drawn already)
         if type(t) is not tuple:
             t = (t, ())
+        elif shared and id(t) in numbers:
+            return numbers[id(t)], None
+        elif shared:
+            numbers[id(t)] = len(nodes)
         n = len(nodes)
         nodes.append((n, t[0]))
-        children = [convert(c) for c in t[1]]
-        edges.extend((n, m) for m in children)
-        return n
+        return n, t[1]
+
+    def convert(tree):
+        # depth first, without recursion, so deep trees (like the MembersTag
+        # chain of a big obj) do not hit the recursion limit; each frame is
+        # (number, iterator over the children, numbers of the children)
+        n, children = enter(tree)
+        stack = [(n, iter(children or ()), [])]
+        while stack:
+            n, children, numbered = stack[-1]
+            for c in children:
+                m, grandchildren = enter(c)
+                numbered.append(m)
+                if grandchildren:
+                    stack.append((m, iter(grandchildren), []))
+                    break
+            else:
+                stack.pop()
+                edges.extend((n, m) for m in numbered)
 
-    convert(tree)
+    if hasattr(tree, 'nodes_and_edges'):
+        nodes, edges = tree.nodes_and_edges()
+    else:
+        convert(tree)
 
     dot = 'digraph G {\n'
     for n, label in nodes: